@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+SIZES = [1000, 100000, 1000000]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark BaseModel save/get/filter/delete, run from the repository root with '
+                    '`python -m benchmarks.bench_models`.'
+    )
+    parser.add_argument('--backend', choices=['memory', 'redis'], default='memory')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES[:1], help=f'rows per run, e.g. {SIZES}')
+    parser.add_argument('--ops', type=int, default=1000, help='sampled operations for get and delete')
+    parser.add_argument('--filter-ops', type=int, default=20, help='sampled operations for filter')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--flush', action='store_true', help='allow deleting every key of the configured redis db')
+    return parser.parse_args()
+
+
+def define_model():
+    from models.base.models import BaseModel
+    from models.base.fields import CharField, IntegerField, JsonField, DatetimeField
+
+    class BenchRecord(BaseModel):
+        name = CharField()
+        group = IntegerField()
+        version = IntegerField()
+        payload = JsonField()
+        created = DatetimeField(auto_now_add=True)
+
+        class Meta:
+            hash_name = 'bench'
+            unique_together = [['name', 'version']]
+            indexes = [['group', 'version'], ['version']]
+
+    return BenchRecord
+
+
+def sizeof(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sizeof(key) + sizeof(item) for key, item in value.items())
+    return size
+
+
+def used_memory(conn):
+    from client.memory_client import InMemoryClient
+    if isinstance(conn, InMemoryClient):
+        return sizeof(conn.store)
+    return conn.redis_conn.info('memory')['used_memory']
+
+
+def measure(conn, name, operations, func):
+    round_trips = conn.round_trips
+    start = time.perf_counter()
+    for operation in operations:
+        func(operation)
+    elapsed = time.perf_counter() - start
+    count = max(len(operations), 1)
+    return name, len(operations), len(operations) / elapsed if elapsed else 0, (conn.round_trips - round_trips) / count
+
+
+def run(conn, model, size, args):
+    from constants.models import BIG_KEY_LIMIT
+    conn.delete_all()
+    rng = random.Random(args.seed)
+    results = []
+    memory = used_memory(conn)
+    primary_keys = []
+    results.append(measure(conn, 'save', range(size), lambda i: primary_keys.append(model(
+        name=f'record-{i}', group=i % 100, version=i % 10, payload={'i': i}
+    ).save())))
+    memory_per_object = (used_memory(conn) - memory) / size
+    samples = rng.sample(range(size), min(args.ops, size))
+    results.append(measure(conn, 'get by pk', samples, lambda i: model.get(id=primary_keys[i])))
+    results.append(measure(conn, 'get by unique', samples, lambda i: model.get(name=f'record-{i}', version=i % 10)))
+    groups = [rng.randrange(100) for _ in range(args.filter_ops)]
+    results.append(measure(
+        conn, 'filter composite', groups, lambda group: list(model.filter(group=group, version=group % 10))
+    ))
+    deleted = [model.get(id=primary_keys[i]) for i in samples]
+    results.append(measure(conn, 'delete', deleted, lambda obj: obj.delete()))
+    partitions = conn.get_by_name(model._keys.index_partition(model._keys.primary_index))
+    print(f'rows={size} partitions={partitions} (BIG_KEY_LIMIT={BIG_KEY_LIMIT}) '
+          f'memory/object={memory_per_object:.0f} bytes')
+    print(f'  {"operation":<18}{"ops":>8}{"ops/s":>12}{"round trips/op":>16}')
+    for name, count, ops, round_trips in results:
+        print(f'  {name:<18}{count:>8}{ops:>12.1f}{round_trips:>16.2f}')
+    conn.delete_all()
+
+
+def main():
+    args = parse_args()
+    if args.backend == 'redis' and not args.flush:
+        sys.exit('the redis backend deletes every key of the configured db, pass --flush to confirm')
+    os.environ['REDISORM_CLIENT'] = args.backend
+    from client import conn
+    model = define_model()
+    for size in args.sizes:
+        run(conn, model, size, args)
+
+
+if __name__ == '__main__':
+    main()
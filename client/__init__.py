@@ -1,8 +1,16 @@
-from .redis_client import RedisClient
+from .memory_client import InMemoryClient, AsyncInMemoryClient
 import json
+import os
 from pathlib import Path
 
 with open(f'{Path(__file__).parent.parent}/config.json', 'r', encoding='utf-8') as f:
     data = json.load(f)
-    conn = RedisClient(**data)
-
+    backend = os.environ.get('REDISORM_CLIENT', data.pop('client', 'redis'))
+    if backend == 'memory':
+        conn = InMemoryClient(**data)
+        aconn = AsyncInMemoryClient(conn)
+    else:
+        from .redis_client import RedisClient
+        from .async_redis_client import AsyncRedisClient
+        conn = RedisClient(**data)
+        aconn = AsyncRedisClient(**data)
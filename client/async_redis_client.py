@@ -0,0 +1,202 @@
+import asyncio
+from contextlib import asynccontextmanager
+from math import ceil
+from time import perf_counter
+from .client import Client
+from .command_log import CommandLog, LOG_MAX_LENGTH
+from .redis_client import RedisPipeline
+from .scripts import (
+    SCRIPTS, SCRIPT_SHAS, hash_filter_args, index_insert_args, index_intersect_args, set_partition_hint,
+)
+from redis import asyncio as redis
+from redis.exceptions import NoScriptError
+
+
+class AsyncRedisClient(Client):
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, log_max_length=LOG_MAX_LENGTH, slow_log_threshold=None):
+        redis_pool = redis.ConnectionPool(host=host, port=port, db=db, decode_responses=True)
+        self.redis_conn = redis.Redis(connection_pool=redis_pool)
+        self.loaded_scripts = set()
+        self.command_log = CommandLog(log_max_length, slow_log_threshold)
+        self.round_trips = 0
+        self.partition_hints = {}
+
+    @asynccontextmanager
+    async def pipeline(self, transaction=False):
+        pipe = AsyncRedisPipeline(self, self.redis_conn.pipeline(transaction=transaction))
+        try:
+            yield pipe
+            await pipe.execute()
+        finally:
+            await pipe.redis_conn.reset()
+
+    async def execute_command(self, command, func, *args, **kwargs):
+        self.round_trips += 1
+        if not self.command_log.enabled:
+            return await func(*args, **kwargs)
+        start = perf_counter()
+        result = await func(*args, **kwargs)
+        self.command_log.log(command, args or kwargs, result, perf_counter() - start)
+        return result
+
+    async def increase_by_name(self, name, amount=1):
+        return await self.execute_command('INCRBY', self.redis_conn.incr, name, amount)
+
+    async def decrease_by_name(self, name):
+        return await self.execute_command('DECR', self.redis_conn.decr, name)
+
+    async def get_by_name(self, name):
+        return await self.execute_command('GET', self.redis_conn.get, name)
+
+    async def get_by_names(self, names):
+        return await self.execute_command('MGET', self.redis_conn.mget, names)
+
+    async def delete_by_name(self, name):
+        return await self.execute_command('DEL', self.redis_conn.delete, name)
+
+    async def unlink_by_names(self, names):
+        return await self.execute_command('UNLINK', self.redis_conn.unlink, *names)
+
+    async def set_value_if_name_not_exists(self, name, value):
+        return await self.execute_command('SETNX', self.redis_conn.setnx, name, value)
+
+    async def expire_by_name(self, name, seconds):
+        return await self.execute_command('PEXPIRE', self.redis_conn.pexpire, name, ceil(seconds * 1000))
+
+    async def persist_by_name(self, name):
+        return await self.execute_command('PERSIST', self.redis_conn.persist, name)
+
+    async def check_name(self, name):
+        return await self.execute_command('EXISTS', self.redis_conn.exists, name)
+
+    async def set_hash(self, name, key, value):
+        return await self.execute_command('HSET', self.redis_conn.hset, name, key, value)
+
+    async def set_hash_mapping(self, name, mapping):
+        return await self.execute_command('HSET', self.redis_conn.hset, name, mapping=mapping)
+
+    async def get_all_hash_by_name(self, name):
+        return await self.execute_command('HGETALL', self.redis_conn.hgetall, name)
+
+    async def scan_hash_by_name(self, name, cursor=0, count=None):
+        return await self.execute_command('HSCAN', self.redis_conn.hscan, name, cursor, count=count)
+
+    async def get_hash_by_name_and_key(self, name, key):
+        return await self.execute_command('HGET', self.redis_conn.hget, name, key)
+
+    async def get_hash_by_name_and_keys(self, name, keys):
+        return await self.execute_command('HMGET', self.redis_conn.hmget, name, keys)
+
+    async def delete_hash_by_name_and_key(self, name, key):
+        return await self.execute_command('HDEL', self.redis_conn.hdel, name, key)
+
+    async def check_hash_by_name_and_key(self, name, key):
+        return await self.execute_command('HEXISTS', self.redis_conn.hexists, name, key)
+
+    async def load_script(self, script):
+        result = await self.execute_command('SCRIPT LOAD', self.redis_conn.script_load, SCRIPTS[script])
+        self.loaded_scripts.add(script)
+        return result
+
+    async def evalsha(self, script, keys, args):
+        try:
+            return await self.execute_command(
+                f'EVALSHA {script}', self.redis_conn.evalsha, SCRIPT_SHAS[script], len(keys), *keys, *args
+            )
+        except NoScriptError:
+            await self.load_script(script)
+            return await self.execute_command(
+                f'EVALSHA {script}', self.redis_conn.evalsha, SCRIPT_SHAS[script], len(keys), *keys, *args
+            )
+
+    async def add_index_members(self, position_name, count_name, partition_name, partition_prefix, members, limit):
+        while True:
+            result = await self.evalsha('index_insert', *index_insert_args(
+                position_name, count_name, partition_name, partition_prefix, members, limit,
+                self.partition_hints.get(partition_name, 0)
+            ))
+            if isinstance(result, list):
+                set_partition_hint(self.partition_hints, partition_name, result[-1] if result else 0)
+                return result
+            set_partition_hint(self.partition_hints, partition_name, result)
+
+    async def remove_index_members(self, count_name, partition_key, members):
+        return await self.evalsha('index_remove', [count_name, partition_key], members)
+
+    async def intersect_index_members(self, members, others):
+        return await self.evalsha('index_intersect', *index_intersect_args(members, others))
+
+    async def filter_hash_names(self, names, conditions):
+        return await self.evalsha('hash_filter', names, hash_filter_args(conditions))
+
+    async def increase_hash_counter(
+        self, name, key, amount, guard, sorted_names=(), sorted_field='', suffix='', member=''
+    ):
+        return await self.evalsha(
+            'hash_counter', [name, *sorted_names], [guard, key, amount, sorted_field, suffix, member]
+        )
+
+    async def add_sorted_members(self, name, mapping):
+        return await self.execute_command('ZADD', self.redis_conn.zadd, name, mapping)
+
+    async def remove_sorted_members(self, name, members):
+        return await self.execute_command('ZREM', self.redis_conn.zrem, name, *members)
+
+    async def range_sorted_by_score(self, name, minimum='-inf', maximum='+inf', offset=0, count=None, desc=False):
+        if desc:
+            return await self.execute_command(
+                'ZREVRANGEBYSCORE', self.redis_conn.zrevrangebyscore, name, maximum, minimum,
+                start=offset if count else None, num=count, withscores=True
+            )
+        return await self.execute_command(
+            'ZRANGEBYSCORE', self.redis_conn.zrangebyscore, name, minimum, maximum,
+            start=offset if count else None, num=count, withscores=True
+        )
+
+    async def count_sorted_by_score(self, name, minimum='-inf', maximum='+inf'):
+        return await self.execute_command('ZCOUNT', self.redis_conn.zcount, name, minimum, maximum)
+
+    async def range_sorted_by_lex(self, name, minimum='-', maximum='+', offset=0, count=None, desc=False):
+        if desc:
+            return await self.execute_command(
+                'ZREVRANGEBYLEX', self.redis_conn.zrevrangebylex, name, maximum, minimum,
+                start=offset if count else None, num=count
+            )
+        return await self.execute_command(
+            'ZRANGEBYLEX', self.redis_conn.zrangebylex, name, minimum, maximum,
+            start=offset if count else None, num=count
+        )
+
+    async def count_sorted_by_lex(self, name, minimum='-', maximum='+'):
+        return await self.execute_command('ZLEXCOUNT', self.redis_conn.zlexcount, name, minimum, maximum)
+
+    async def publish(self, channel, message):
+        return await self.execute_command('PUBLISH', self.redis_conn.publish, channel, message)
+
+    async def subscribe(self, channel, handler):
+        pubsub = self.redis_conn.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(**{channel: lambda message: handler(message['data'])})
+        return asyncio.ensure_future(pubsub.run())
+
+    async def delete_all(self):
+        async for key in self.redis_conn.scan_iter():
+            await self.execute_command('DEL', self.redis_conn.delete, key)
+
+    async def close(self):
+        await self.redis_conn.connection_pool.disconnect()
+
+
+class AsyncRedisPipeline(RedisPipeline):
+
+    async def execute(self):
+        self.started = perf_counter()
+        self.client.round_trips += 1
+        for script in self.missing_scripts():
+            await self.client.load_script(script)
+        results = await self.redis_conn.execute(raise_on_error=False)
+        for position, script, keys, args in self.failed_scripts(results):
+            results[position] = await self.client.evalsha(script, keys, args)
+        for position, call in self.missed_inserts(results):
+            results[position] = await self.client.add_index_members(*call)
+        return self.set_results(results)
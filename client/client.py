@@ -4,7 +4,11 @@ from abc import abstractmethod, ABCMeta
 class Client(metaclass=ABCMeta):
 
     @abstractmethod
-    def increase_by_name(self, name):
+    def pipeline(self, transaction=False):
+        pass
+
+    @abstractmethod
+    def increase_by_name(self, name, amount=1):
         pass
 
     @abstractmethod
@@ -15,14 +19,30 @@ class Client(metaclass=ABCMeta):
     def get_by_name(self, name):
         pass
 
+    @abstractmethod
+    def get_by_names(self, names):
+        pass
+
     @abstractmethod
     def delete_by_name(self, name):
         pass
 
+    @abstractmethod
+    def unlink_by_names(self, names):
+        pass
+
     @abstractmethod
     def set_value_if_name_not_exists(self, name, value):
         pass
 
+    @abstractmethod
+    def expire_by_name(self, name, seconds):
+        pass
+
+    @abstractmethod
+    def persist_by_name(self, name):
+        pass
+
     @abstractmethod
     def check_name(self, name):
         pass
@@ -31,14 +51,26 @@ class Client(metaclass=ABCMeta):
     def set_hash(self, name, key, value):
         pass
 
+    @abstractmethod
+    def set_hash_mapping(self, name, mapping):
+        pass
+
     @abstractmethod
     def get_all_hash_by_name(self, name):
         pass
 
+    @abstractmethod
+    def scan_hash_by_name(self, name, cursor=0, count=None):
+        pass
+
     @abstractmethod
     def get_hash_by_name_and_key(self, name, key):
         pass
 
+    @abstractmethod
+    def get_hash_by_name_and_keys(self, name, keys):
+        pass
+
     @abstractmethod
     def delete_hash_by_name_and_key(self, name, key):
         pass
@@ -47,6 +79,58 @@ class Client(metaclass=ABCMeta):
     def check_hash_by_name_and_key(self, name, key):
         pass
 
+    @abstractmethod
+    def add_index_members(self, position_name, count_name, partition_name, partition_prefix, members, limit):
+        pass
+
+    @abstractmethod
+    def remove_index_members(self, count_name, partition_key, members):
+        pass
+
+    @abstractmethod
+    def intersect_index_members(self, members, others):
+        pass
+
+    @abstractmethod
+    def filter_hash_names(self, names, conditions):
+        pass
+
+    @abstractmethod
+    def increase_hash_counter(self, name, key, amount, guard, sorted_names=(), sorted_field='', suffix='', member=''):
+        pass
+
+    @abstractmethod
+    def add_sorted_members(self, name, mapping):
+        pass
+
+    @abstractmethod
+    def remove_sorted_members(self, name, members):
+        pass
+
+    @abstractmethod
+    def range_sorted_by_score(self, name, minimum='-inf', maximum='+inf', offset=0, count=None, desc=False):
+        pass
+
+    @abstractmethod
+    def count_sorted_by_score(self, name, minimum='-inf', maximum='+inf'):
+        pass
+
+    @abstractmethod
+    def range_sorted_by_lex(self, name, minimum='-', maximum='+', offset=0, count=None, desc=False):
+        pass
+
+    @abstractmethod
+    def count_sorted_by_lex(self, name, minimum='-', maximum='+'):
+        pass
+
+    @abstractmethod
+    def publish(self, channel, message):
+        pass
+
+    @abstractmethod
+    def subscribe(self, channel, handler):
+        pass
+
     @abstractmethod
     def delete_all(self):
         pass
@@ -0,0 +1,43 @@
+import logging
+
+logger = logging.getLogger('redisorm.client')
+
+LOG_MAX_LENGTH = 200
+LOG_MAX_ITEMS = 10
+
+
+def summarize(value, max_length=LOG_MAX_LENGTH, max_items=LOG_MAX_ITEMS):
+    # 只截取前几项, 避免为了打日志把整个大 hash 格式化一遍
+    if isinstance(value, dict) and len(value) > max_items:
+        items = dict(item for _, item in zip(range(max_items), value.items()))
+        text = f'{items!r}...({len(value)} items)'
+    elif isinstance(value, (list, tuple)) and len(value) > max_items:
+        text = f'{value[:max_items]!r}...({len(value)} items)'
+    else:
+        text = repr(value)
+    if len(text) > max_length:
+        return f'{text[:max_length]}...({len(text)} chars)'
+    return text
+
+
+class CommandLog:
+
+    def __init__(self, max_length=LOG_MAX_LENGTH, slow_threshold=None):
+        self.max_length = max_length
+        self.slow_threshold = slow_threshold
+
+    @property
+    def enabled(self):
+        return self.slow_threshold is not None or logger.isEnabledFor(logging.DEBUG)
+
+    def log(self, command, args, result, elapsed):
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            level = logging.WARNING
+        elif logger.isEnabledFor(logging.DEBUG):
+            level = logging.DEBUG
+        else:
+            return
+        logger.log(
+            level, 'redis: %s %s, result=%s, %.3fms', command,
+            summarize(args, self.max_length), summarize(result, self.max_length), elapsed * 1000
+        )
@@ -0,0 +1,416 @@
+import json
+import time
+from contextlib import contextmanager, asynccontextmanager
+from functools import wraps
+from itertools import islice
+from threading import RLock
+from .client import Client
+
+
+def score_bound(value, lower):
+    # 与 redis 相同的分数区间写法: '-inf', '+inf', '(1.5' 表示开区间
+    value = str(value)
+    if value.startswith('('):
+        bound = float(value[1:])
+        return (lambda score: score > bound) if lower else (lambda score: score < bound)
+    bound = float(value)
+    return (lambda score: score >= bound) if lower else (lambda score: score <= bound)
+
+
+def lex_bound(value, lower):
+    # '-' 与 '+' 表示负无穷与正无穷, '[' 为闭区间, '(' 为开区间
+    if value in ('-', '+'):
+        return lambda member: (value == '-') == lower
+    bound = value[1:]
+    if value.startswith('('):
+        return (lambda member: member > bound) if lower else (lambda member: member < bound)
+    return (lambda member: member >= bound) if lower else (lambda member: member <= bound)
+
+
+def round_trip(func):
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.track_round_trip():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+class InMemoryClient(Client):
+
+    def __init__(self, **kwargs):
+        self.store = {}
+        # name -> 过期的 time.monotonic(), 每次命令前清除已经过期的 key
+        self.expires = {}
+        self.lock = RLock()
+        self.depth = 0
+        self.round_trips = 0
+        self.subscribers = {}
+
+    @contextmanager
+    def track_round_trip(self):
+        # 嵌套调用与 pipeline 内的命令不计入 round trip
+        with self.lock:
+            if not self.depth:
+                self.round_trips += 1
+                self.remove_expired()
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+
+    def remove_expired(self):
+        now = time.monotonic()
+        for name in [name for name, deadline in self.expires.items() if deadline <= now]:
+            del self.expires[name]
+            self.store.pop(name, None)
+
+    def remove_name(self, name):
+        self.expires.pop(name, None)
+        return self.store.pop(name, None)
+
+    @contextmanager
+    def pipeline(self, transaction=False):
+        pipe = InMemoryPipeline(self)
+        yield pipe
+        pipe.execute()
+
+    @round_trip
+    def increase_by_name(self, name, amount=1):
+        result = int(self.store.get(name, 0)) + amount
+        self.store[name] = str(result)
+        return result
+
+    @round_trip
+    def decrease_by_name(self, name):
+        return self.increase_by_name(name, -1)
+
+    @round_trip
+    def get_by_name(self, name):
+        return self.store.get(name)
+
+    @round_trip
+    def get_by_names(self, names):
+        return [self.store.get(name) for name in names]
+
+    @round_trip
+    def delete_by_name(self, name):
+        return 1 if self.remove_name(name) is not None else 0
+
+    @round_trip
+    def unlink_by_names(self, names):
+        return sum(self.delete_by_name(name) for name in names)
+
+    @round_trip
+    def set_value_if_name_not_exists(self, name, value):
+        if name in self.store:
+            return False
+        self.store[name] = str(value)
+        return True
+
+    @round_trip
+    def expire_by_name(self, name, seconds):
+        if name not in self.store:
+            return 0
+        self.expires[name] = time.monotonic() + seconds
+        return 1
+
+    @round_trip
+    def persist_by_name(self, name):
+        return 1 if self.expires.pop(name, None) is not None else 0
+
+    @round_trip
+    def check_name(self, name):
+        return 1 if name in self.store else 0
+
+    @round_trip
+    def set_hash(self, name, key, value):
+        return self.set_hash_mapping(name, {key: value})
+
+    @round_trip
+    def set_hash_mapping(self, name, mapping):
+        values = self.store.setdefault(name, {})
+        result = len([key for key in mapping if key not in values])
+        values.update({key: str(value) for key, value in mapping.items()})
+        return result
+
+    @round_trip
+    def get_all_hash_by_name(self, name):
+        return dict(self.store.get(name, {}))
+
+    @round_trip
+    def scan_hash_by_name(self, name, cursor=0, count=None):
+        # cursor 为已返回的 field 数量, 返回 0 表示扫描结束
+        values = self.store.get(name, {})
+        keys = list(islice(values, cursor, cursor + (count or 10)))
+        cursor += len(keys)
+        return (cursor if cursor < len(values) else 0), {key: values[key] for key in keys}
+
+    @round_trip
+    def get_hash_by_name_and_key(self, name, key):
+        return self.store.get(name, {}).get(key)
+
+    @round_trip
+    def get_hash_by_name_and_keys(self, name, keys):
+        values = self.store.get(name, {})
+        return [values.get(key) for key in keys]
+
+    @round_trip
+    def delete_hash_by_name_and_key(self, name, key):
+        values = self.store.get(name, {})
+        if key not in values:
+            return 0
+        del values[key]
+        if not values:
+            self.remove_name(name)
+        return 1
+
+    @round_trip
+    def check_hash_by_name_and_key(self, name, key):
+        return key in self.store.get(name, {})
+
+    @round_trip
+    def add_index_members(self, position_name, count_name, partition_name, partition_prefix, members, limit):
+        count = len(members)
+        position = self.increase_by_name(position_name, count) - count
+        partition = int(self.store.get(partition_name, 0))
+        partitions = []
+        for member in members:
+            position += 1
+            if position % limit == 1 or limit == 1 or partition == 0:
+                partition = self.increase_by_name(partition_name)
+            self.set_hash(f'{partition_prefix}{partition}', member, 1)
+            partitions.append(partition)
+        self.increase_by_name(count_name, count)
+        return partitions
+
+    @round_trip
+    def remove_index_members(self, count_name, partition_key, members):
+        removed = sum(self.delete_hash_by_name_and_key(partition_key, member) for member in members)
+        if removed:
+            self.increase_by_name(count_name, -removed)
+        return removed
+
+    @round_trip
+    def intersect_index_members(self, members, others):
+        return [member for member in members if all(
+            any(member in self.store.get(name, {}) for name in names) for names in others
+        )]
+
+    @round_trip
+    def filter_hash_names(self, names, conditions):
+        return [name for name in names if all(
+            all(
+                self.store.get(name, {}).get(key, '') == ('' if value is None else str(value))
+                for key, value in mapping.items()
+            ) == keep
+            for keep, mapping in conditions
+        )]
+
+    @round_trip
+    def increase_hash_counter(self, name, key, amount, guard, sorted_names=(), sorted_field='', suffix='', member=''):
+        values = self.store.get(name, {})
+        if guard not in values:
+            return None
+        if sorted_field:
+            stored = values.get(sorted_field)
+            names = [sorted_name for sorted_name in json.loads(stored or '[]') if sorted_name.endswith(suffix)]
+            if names != list(sorted_names):
+                return stored or ''
+        value = int(values.get(key, 0)) + int(amount)
+        values[key] = str(value)
+        for sorted_name in sorted_names:
+            self.add_sorted_members(sorted_name, {member: value})
+        return value
+
+    @round_trip
+    def add_sorted_members(self, name, mapping):
+        members = self.store.setdefault(name, {})
+        result = len([member for member in mapping if str(member) not in members])
+        members.update({str(member): float(score) for member, score in mapping.items()})
+        return result
+
+    @round_trip
+    def remove_sorted_members(self, name, members):
+        values = self.store.get(name, {})
+        removed = len([values.pop(str(member)) for member in members if str(member) in values])
+        if name in self.store and not values:
+            self.remove_name(name)
+        return removed
+
+    @round_trip
+    def range_sorted_by_score(self, name, minimum='-inf', maximum='+inf', offset=0, count=None, desc=False):
+        above, below = score_bound(minimum, True), score_bound(maximum, False)
+        items = sorted(
+            ((member, score) for member, score in self.store.get(name, {}).items() if above(score) and below(score)),
+            key=lambda item: (item[1], item[0]), reverse=desc
+        )
+        return items[offset:offset + count] if count else items
+
+    @round_trip
+    def count_sorted_by_score(self, name, minimum='-inf', maximum='+inf'):
+        return len(self.range_sorted_by_score(name, minimum, maximum))
+
+    @round_trip
+    def range_sorted_by_lex(self, name, minimum='-', maximum='+', offset=0, count=None, desc=False):
+        above, below = lex_bound(minimum, True), lex_bound(maximum, False)
+        members = sorted(
+            (member for member in self.store.get(name, {}) if above(member) and below(member)), reverse=desc
+        )
+        return members[offset:offset + count] if count else members
+
+    @round_trip
+    def count_sorted_by_lex(self, name, minimum='-', maximum='+'):
+        return len(self.range_sorted_by_lex(name, minimum, maximum))
+
+    @round_trip
+    def publish(self, channel, message):
+        handlers = self.subscribers.get(channel, [])
+        for handler in handlers:
+            handler(str(message))
+        return len(handlers)
+
+    def subscribe(self, channel, handler):
+        self.subscribers.setdefault(channel, []).append(handler)
+
+    @round_trip
+    def delete_all(self):
+        self.store.clear()
+        self.expires.clear()
+
+
+class InMemoryPipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+        self.results = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.client.track_round_trip():
+            self.results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return self.results
+
+
+class AsyncInMemoryClient(Client):
+
+    def __init__(self, client):
+        self.client = client
+
+    @asynccontextmanager
+    async def pipeline(self, transaction=False):
+        pipe = InMemoryPipeline(self.client)
+        yield pipe
+        pipe.execute()
+
+    async def increase_by_name(self, name, amount=1):
+        return self.client.increase_by_name(name, amount)
+
+    async def decrease_by_name(self, name):
+        return self.client.decrease_by_name(name)
+
+    async def get_by_name(self, name):
+        return self.client.get_by_name(name)
+
+    async def get_by_names(self, names):
+        return self.client.get_by_names(names)
+
+    async def delete_by_name(self, name):
+        return self.client.delete_by_name(name)
+
+    async def unlink_by_names(self, names):
+        return self.client.unlink_by_names(names)
+
+    async def set_value_if_name_not_exists(self, name, value):
+        return self.client.set_value_if_name_not_exists(name, value)
+
+    async def expire_by_name(self, name, seconds):
+        return self.client.expire_by_name(name, seconds)
+
+    async def persist_by_name(self, name):
+        return self.client.persist_by_name(name)
+
+    async def check_name(self, name):
+        return self.client.check_name(name)
+
+    async def set_hash(self, name, key, value):
+        return self.client.set_hash(name, key, value)
+
+    async def set_hash_mapping(self, name, mapping):
+        return self.client.set_hash_mapping(name, mapping)
+
+    async def get_all_hash_by_name(self, name):
+        return self.client.get_all_hash_by_name(name)
+
+    async def scan_hash_by_name(self, name, cursor=0, count=None):
+        return self.client.scan_hash_by_name(name, cursor, count)
+
+    async def get_hash_by_name_and_key(self, name, key):
+        return self.client.get_hash_by_name_and_key(name, key)
+
+    async def get_hash_by_name_and_keys(self, name, keys):
+        return self.client.get_hash_by_name_and_keys(name, keys)
+
+    async def delete_hash_by_name_and_key(self, name, key):
+        return self.client.delete_hash_by_name_and_key(name, key)
+
+    async def check_hash_by_name_and_key(self, name, key):
+        return self.client.check_hash_by_name_and_key(name, key)
+
+    async def add_index_members(self, position_name, count_name, partition_name, partition_prefix, members, limit):
+        return self.client.add_index_members(
+            position_name, count_name, partition_name, partition_prefix, members, limit
+        )
+
+    async def remove_index_members(self, count_name, partition_key, members):
+        return self.client.remove_index_members(count_name, partition_key, members)
+
+    async def intersect_index_members(self, members, others):
+        return self.client.intersect_index_members(members, others)
+
+    async def filter_hash_names(self, names, conditions):
+        return self.client.filter_hash_names(names, conditions)
+
+    async def increase_hash_counter(
+        self, name, key, amount, guard, sorted_names=(), sorted_field='', suffix='', member=''
+    ):
+        return self.client.increase_hash_counter(name, key, amount, guard, sorted_names, sorted_field, suffix, member)
+
+    async def add_sorted_members(self, name, mapping):
+        return self.client.add_sorted_members(name, mapping)
+
+    async def remove_sorted_members(self, name, members):
+        return self.client.remove_sorted_members(name, members)
+
+    async def range_sorted_by_score(self, name, minimum='-inf', maximum='+inf', offset=0, count=None, desc=False):
+        return self.client.range_sorted_by_score(name, minimum, maximum, offset, count, desc)
+
+    async def count_sorted_by_score(self, name, minimum='-inf', maximum='+inf'):
+        return self.client.count_sorted_by_score(name, minimum, maximum)
+
+    async def range_sorted_by_lex(self, name, minimum='-', maximum='+', offset=0, count=None, desc=False):
+        return self.client.range_sorted_by_lex(name, minimum, maximum, offset, count, desc)
+
+    async def count_sorted_by_lex(self, name, minimum='-', maximum='+'):
+        return self.client.count_sorted_by_lex(name, minimum, maximum)
+
+    async def publish(self, channel, message):
+        return self.client.publish(channel, message)
+
+    async def subscribe(self, channel, handler):
+        return self.client.subscribe(channel, handler)
+
+    async def delete_all(self):
+        self.client.delete_all()
+
+    async def close(self):
+        pass
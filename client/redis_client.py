@@ -1,74 +1,259 @@
+from contextlib import contextmanager
+from math import ceil
+from time import perf_counter
 from .client import Client
+from .command_log import CommandLog, LOG_MAX_LENGTH
+from .scripts import (
+    SCRIPTS, SCRIPT_SHAS, hash_filter_args, index_insert_args, index_intersect_args, set_partition_hint,
+)
 import redis
+from redis.exceptions import NoScriptError
 
 
 class RedisClient(Client):
 
-    def __init__(self, host='127.0.0.1', port=6379, db=0):
+    def __init__(self, host='127.0.0.1', port=6379, db=0, log_max_length=LOG_MAX_LENGTH, slow_log_threshold=None):
         redis_pool = redis.ConnectionPool(host=host, port=port, db=db, decode_responses=True)
         self.redis_conn = redis.Redis(connection_pool=redis_pool)
+        self.loaded_scripts = set()
+        self.command_log = CommandLog(log_max_length, slow_log_threshold)
+        self.round_trips = 0
+        # partition 计数器 -> 已知的当前分区, 决定 index_insert 在 KEYS 中声明哪些分区
+        self.partition_hints = {}
 
-    def increase_by_name(self, name):
-        result = self.redis_conn.incr(name)
-        print(f'redis: increase {name=} by 1, {result=}')
+    @contextmanager
+    def pipeline(self, transaction=False):
+        pipe = RedisPipeline(self, self.redis_conn.pipeline(transaction=transaction))
+        try:
+            yield pipe
+            pipe.execute()
+        finally:
+            pipe.redis_conn.reset()
+
+    def execute_command(self, command, func, *args, **kwargs):
+        self.round_trips += 1
+        if not self.command_log.enabled:
+            return func(*args, **kwargs)
+        start = perf_counter()
+        result = func(*args, **kwargs)
+        self.command_log.log(command, args or kwargs, result, perf_counter() - start)
         return result
 
+    def increase_by_name(self, name, amount=1):
+        return self.execute_command('INCRBY', self.redis_conn.incr, name, amount)
+
     def decrease_by_name(self, name):
-        result = self.redis_conn.decr(name)
-        print(f'redis: decrease {name=} by 1, {result=}')
-        return result
+        return self.execute_command('DECR', self.redis_conn.decr, name)
 
     def get_by_name(self, name):
-        result = self.redis_conn.get(name)
-        print(f'redis: get {name=} , {result=}')
-        return result
+        return self.execute_command('GET', self.redis_conn.get, name)
+
+    def get_by_names(self, names):
+        return self.execute_command('MGET', self.redis_conn.mget, names)
 
     def delete_by_name(self, name):
-        result = self.redis_conn.delete(name)
-        print(f'redis: delete {name=} , {result=}')
-        return result
+        return self.execute_command('DEL', self.redis_conn.delete, name)
+
+    def unlink_by_names(self, names):
+        return self.execute_command('UNLINK', self.redis_conn.unlink, *names)
 
     def set_value_if_name_not_exists(self, name, value):
-        result = self.redis_conn.setnx(name, value)
-        print(f'redis: set {name} = {value} if {name=} does not exist, {result=}')
-        return result
+        return self.execute_command('SETNX', self.redis_conn.setnx, name, value)
+
+    def expire_by_name(self, name, seconds):
+        return self.execute_command('PEXPIRE', self.redis_conn.pexpire, name, ceil(seconds * 1000))
+
+    def persist_by_name(self, name):
+        return self.execute_command('PERSIST', self.redis_conn.persist, name)
 
     def check_name(self, name):
-        result = self.redis_conn.exists(name)
-        print(f'redis: check if {name} exist, {result=}')
-        return result
+        return self.execute_command('EXISTS', self.redis_conn.exists, name)
 
     def set_hash(self, name, key, value):
-        result = self.redis_conn.hset(name, key, value)
-        print(f'redis: set hash {name=}, {key=}, {value=}, {result=}')
-        return result
+        return self.execute_command('HSET', self.redis_conn.hset, name, key, value)
+
+    def set_hash_mapping(self, name, mapping):
+        return self.execute_command('HSET', self.redis_conn.hset, name, mapping=mapping)
 
     def get_all_hash_by_name(self, name):
-        result = self.redis_conn.hgetall(name)
-        print(f'redis: get all hash by {name=}, {result=}')
-        return result
+        return self.execute_command('HGETALL', self.redis_conn.hgetall, name)
+
+    def scan_hash_by_name(self, name, cursor=0, count=None):
+        return self.execute_command('HSCAN', self.redis_conn.hscan, name, cursor, count=count)
 
     def get_hash_by_name_and_key(self, name, key):
-        result = self.redis_conn.hget(name, key)
-        print(f'redis: get hash by {name=} - {key=}, {result=}')
-        return result
+        return self.execute_command('HGET', self.redis_conn.hget, name, key)
+
+    def get_hash_by_name_and_keys(self, name, keys):
+        return self.execute_command('HMGET', self.redis_conn.hmget, name, keys)
 
     def delete_hash_by_name_and_key(self, name, key):
-        result = self.redis_conn.hdel(name, key)
-        print(f'redis: delete hash by {name=} - {key=}, {result=}')
-        return result
+        return self.execute_command('HDEL', self.redis_conn.hdel, name, key)
 
     def check_hash_by_name_and_key(self, name, key):
-        result = self.redis_conn.hexists(name, key)
-        print(f'redis: check hash by {name=} - {key=}, {result=}')
+        return self.execute_command('HEXISTS', self.redis_conn.hexists, name, key)
+
+    def load_script(self, script):
+        result = self.execute_command('SCRIPT LOAD', self.redis_conn.script_load, SCRIPTS[script])
+        self.loaded_scripts.add(script)
         return result
 
+    def evalsha(self, script, keys, args):
+        try:
+            return self.execute_command(
+                f'EVALSHA {script}', self.redis_conn.evalsha, SCRIPT_SHAS[script], len(keys), *keys, *args
+            )
+        except NoScriptError:
+            self.load_script(script)
+            return self.execute_command(
+                f'EVALSHA {script}', self.redis_conn.evalsha, SCRIPT_SHAS[script], len(keys), *keys, *args
+            )
+
+    def add_index_members(self, position_name, count_name, partition_name, partition_prefix, members, limit):
+        # 分区已经变化时脚本不写入, 返回当前分区号, 按新的分区号重试
+        while True:
+            result = self.evalsha('index_insert', *index_insert_args(
+                position_name, count_name, partition_name, partition_prefix, members, limit,
+                self.partition_hints.get(partition_name, 0)
+            ))
+            if isinstance(result, list):
+                set_partition_hint(self.partition_hints, partition_name, result[-1] if result else 0)
+                return result
+            set_partition_hint(self.partition_hints, partition_name, result)
+
+    def remove_index_members(self, count_name, partition_key, members):
+        return self.evalsha('index_remove', [count_name, partition_key], members)
+
+    def intersect_index_members(self, members, others):
+        return self.evalsha('index_intersect', *index_intersect_args(members, others))
+
+    def filter_hash_names(self, names, conditions):
+        return self.evalsha('hash_filter', names, hash_filter_args(conditions))
+
+    def increase_hash_counter(self, name, key, amount, guard, sorted_names=(), sorted_field='', suffix='', member=''):
+        return self.evalsha(
+            'hash_counter', [name, *sorted_names], [guard, key, amount, sorted_field, suffix, member]
+        )
+
+    def add_sorted_members(self, name, mapping):
+        return self.execute_command('ZADD', self.redis_conn.zadd, name, mapping)
+
+    def remove_sorted_members(self, name, members):
+        return self.execute_command('ZREM', self.redis_conn.zrem, name, *members)
+
+    def range_sorted_by_score(self, name, minimum='-inf', maximum='+inf', offset=0, count=None, desc=False):
+        # 返回 (member, score) 列表, desc 为 True 时按分数从大到小
+        if desc:
+            return self.execute_command(
+                'ZREVRANGEBYSCORE', self.redis_conn.zrevrangebyscore, name, maximum, minimum,
+                start=offset if count else None, num=count, withscores=True
+            )
+        return self.execute_command(
+            'ZRANGEBYSCORE', self.redis_conn.zrangebyscore, name, minimum, maximum,
+            start=offset if count else None, num=count, withscores=True
+        )
+
+    def count_sorted_by_score(self, name, minimum='-inf', maximum='+inf'):
+        return self.execute_command('ZCOUNT', self.redis_conn.zcount, name, minimum, maximum)
+
+    def range_sorted_by_lex(self, name, minimum='-', maximum='+', offset=0, count=None, desc=False):
+        if desc:
+            return self.execute_command(
+                'ZREVRANGEBYLEX', self.redis_conn.zrevrangebylex, name, maximum, minimum,
+                start=offset if count else None, num=count
+            )
+        return self.execute_command(
+            'ZRANGEBYLEX', self.redis_conn.zrangebylex, name, minimum, maximum,
+            start=offset if count else None, num=count
+        )
+
+    def count_sorted_by_lex(self, name, minimum='-', maximum='+'):
+        return self.execute_command('ZLEXCOUNT', self.redis_conn.zlexcount, name, minimum, maximum)
+
+    def publish(self, channel, message):
+        return self.execute_command('PUBLISH', self.redis_conn.publish, channel, message)
+
+    def subscribe(self, channel, handler):
+        pubsub = self.redis_conn.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: lambda message: handler(message['data'])})
+        return pubsub.run_in_thread(sleep_time=1, daemon=True)
+
     def delete_all(self):
         start = 1
         results = self.redis_conn.keys()
         for key in results:
-            print(f'{key}, {self.redis_conn.delete(key)}')
+            self.execute_command('DEL', self.redis_conn.delete, key)
         while start != 0:
             start, results = self.redis_conn.scan(start)
             for result in results:
-                print(f'{result}, {self.redis_conn.delete(result)}')
+                self.execute_command('DEL', self.redis_conn.delete, result)
+
+
+class RedisPipeline(RedisClient):
+
+    def __init__(self, client, redis_pipeline):
+        self.client = client
+        self.redis_conn = redis_pipeline
+        self.command_log = client.command_log
+        self.partition_hints = client.partition_hints
+        self.scripts = {}
+        self.inserts = {}
+        self.results = []
+        self.started = None
+
+    def execute_command(self, command, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    def evalsha(self, script, keys, args):
+        self.scripts[len(self.redis_conn)] = (script, keys, args)
+        return self.redis_conn.evalsha(SCRIPT_SHAS[script], len(keys), *keys, *args)
+
+    def add_index_members(self, position_name, count_name, partition_name, partition_prefix, members, limit):
+        call = (position_name, count_name, partition_name, partition_prefix, members, limit)
+        self.inserts[len(self.redis_conn)] = call
+        return self.evalsha('index_insert', *index_insert_args(
+            *call, self.partition_hints.get(partition_name, 0)
+        ))
+
+    def missed_inserts(self, results):
+        # 分区已经变化的 index_insert 没有写入任何数据, 可以在 pipeline 之后重新执行
+        missed = []
+        for position, call in self.inserts.items():
+            result = results[position]
+            if isinstance(result, list):
+                set_partition_hint(self.partition_hints, call[2], result[-1] if result else 0)
+            elif not isinstance(result, Exception):
+                set_partition_hint(self.partition_hints, call[2], result)
+                missed.append((position, call))
+        return missed
+
+    def missing_scripts(self):
+        return {script for script, _, _ in self.scripts.values()} - self.client.loaded_scripts
+
+    def failed_scripts(self, results):
+        # 服务端的脚本缓存被清空, 失败的 EVALSHA 没有执行, 可以安全地重新执行
+        return [
+            (position, script, keys, args) for position, (script, keys, args) in self.scripts.items()
+            if isinstance(results[position], NoScriptError)
+        ]
+
+    def set_results(self, results):
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        self.results = results
+        if self.command_log.enabled:
+            self.command_log.log('PIPELINE', (len(results),), results, perf_counter() - self.started)
+        return self.results
+
+    def execute(self):
+        self.started = perf_counter()
+        self.client.round_trips += 1
+        for script in self.missing_scripts():
+            self.client.load_script(script)
+        results = self.redis_conn.execute(raise_on_error=False)
+        for position, script, keys, args in self.failed_scripts(results):
+            results[position] = self.client.evalsha(script, keys, args)
+        for position, call in self.missed_inserts(results):
+            results[position] = self.client.add_index_members(*call)
+        return self.set_results(results)
@@ -0,0 +1,189 @@
+from hashlib import sha1
+
+# KEYS: position, count, partition, 从第 ARGV[2] 个分区开始的分区 hash; ARGV: limit, 第一个分区, members...
+# 成员要写入的分区不在 KEYS 中时不写入任何数据, 返回当前分区
+INDEX_INSERT = """
+local limit = tonumber(ARGV[1])
+local first = tonumber(ARGV[2])
+local count = #ARGV - 2
+local position = tonumber(redis.call('GET', KEYS[1]) or 0)
+local current = tonumber(redis.call('GET', KEYS[3]) or 0)
+local partition = current
+local partitions = {}
+local fields = {}
+for i = 3, #ARGV do
+    position = position + 1
+    if position % limit == 1 or limit == 1 or partition == 0 then
+        partition = partition + 1
+    end
+    local key = KEYS[3 + partition - first + 1]
+    if partition < first or not key then
+        return current
+    end
+    if not fields[key] then
+        fields[key] = {}
+    end
+    table.insert(fields[key], ARGV[i])
+    table.insert(fields[key], 1)
+    table.insert(partitions, partition)
+end
+for key, values in pairs(fields) do
+    redis.call('HSET', key, unpack(values))
+end
+redis.call('SET', KEYS[1], position)
+redis.call('SET', KEYS[3], partition)
+redis.call('INCRBY', KEYS[2], count)
+return partitions
+"""
+
+# KEYS: count, 分区 hash; ARGV: members...
+INDEX_REMOVE = """
+local removed = redis.call('HDEL', KEYS[2], unpack(ARGV))
+if removed > 0 then
+    redis.call('DECRBY', KEYS[1], removed)
+end
+return removed
+"""
+
+# KEYS: 对象的 hash
+# ARGV: 条件个数, 之后每个条件依次为: 1 保留匹配的 hash 或 0 去掉匹配的 hash, 字段个数, fields..., values...
+# 缺失的字段等于 ''
+HASH_FILTER = """
+local conditions = {}
+local offset = 2
+for c = 1, tonumber(ARGV[1]) do
+    local count = tonumber(ARGV[offset + 1])
+    local fields, values = {}, {}
+    for i = 1, count do
+        fields[i] = ARGV[offset + 1 + i]
+        values[i] = ARGV[offset + 1 + count + i]
+    end
+    table.insert(conditions, {ARGV[offset] == '1', fields, values})
+    offset = offset + 2 + count * 2
+end
+local matched = {}
+for _, key in ipairs(KEYS) do
+    local keep = true
+    for _, condition in ipairs(conditions) do
+        local match = true
+        if #condition[2] > 0 then
+            local current = redis.call('HMGET', key, unpack(condition[2]))
+            for i = 1, #condition[2] do
+                if (current[i] or '') ~= condition[3][i] then
+                    match = false
+                    break
+                end
+            end
+        end
+        if match ~= condition[1] then
+            keep = false
+            break
+        end
+    end
+    if keep then
+        table.insert(matched, key)
+    end
+end
+return matched
+"""
+
+# KEYS: 其他每个索引的分区 hash, 按索引依次排列
+# ARGV: 索引个数, 每个索引的分区个数..., members...
+INDEX_INTERSECT = """
+local indexes = tonumber(ARGV[1])
+local matched = {}
+for i = indexes + 2, #ARGV do
+    local keep = true
+    local offset = 0
+    for index = 1, indexes do
+        local size = tonumber(ARGV[1 + index])
+        local found = false
+        for key = offset + 1, offset + size do
+            if redis.call('HEXISTS', KEYS[key], ARGV[i]) == 1 then
+                found = true
+                break
+            end
+        end
+        offset = offset + size
+        if not found then
+            keep = false
+            break
+        end
+    end
+    if keep then
+        table.insert(matched, ARGV[i])
+    end
+end
+return matched
+"""
+
+# KEYS: 对象的 hash, 以该字段为分数的 sorted set
+# ARGV: 检查存在的字段, 字段, 增量, 保存 sorted set 名字 json 列表的字段或 '', sorted set 名字的后缀, member
+# 检查的字段不存在时不修改 hash, 返回 nil
+# json 列表中以后缀结尾的名字必须与 KEYS[2..] 相同, 否则不写入任何数据, 返回 json 列表, 调用方按它重试
+HASH_COUNTER = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return false
+end
+if ARGV[4] ~= '' then
+    local stored = redis.call('HGET', KEYS[1], ARGV[4])
+    local names = {}
+    if stored then
+        for _, name in ipairs(cjson.decode(stored)) do
+            if string.sub(name, -#ARGV[5]) == ARGV[5] then
+                table.insert(names, name)
+            end
+        end
+    end
+    local same = #names == #KEYS - 1
+    for i = 1, #names do
+        same = same and names[i] == KEYS[i + 1]
+    end
+    if not same then
+        return stored or ''
+    end
+end
+local value = redis.call('HINCRBY', KEYS[1], ARGV[2], ARGV[3])
+for i = 2, #KEYS do
+    redis.call('ZADD', KEYS[i], value, ARGV[6])
+end
+return value
+"""
+
+SCRIPTS = {
+    'index_insert': INDEX_INSERT,
+    'index_remove': INDEX_REMOVE,
+    'hash_filter': HASH_FILTER,
+    'index_intersect': INDEX_INTERSECT,
+    'hash_counter': HASH_COUNTER,
+}
+
+
+def index_insert_args(position_name, count_name, partition_name, partition_prefix, members, limit, partition):
+    # 从 partition 开始声明这批成员可能写入的所有分区, 每 limit 个成员最多换一次分区
+    first = max(int(partition), 1)
+    partitions = [f'{partition_prefix}{first + i}' for i in range(-(-len(members) // limit) + 1)]
+    return [position_name, count_name, partition_name, *partitions], [limit, first, *members]
+
+
+def set_partition_hint(hints, partition_name, partition):
+    # 只记住已经超过第一个分区的索引, 新索引与小索引都从第一个分区开始写入
+    if int(partition) > 1:
+        hints[partition_name] = int(partition)
+    else:
+        hints.pop(partition_name, None)
+
+
+def index_intersect_args(members, others):
+    return [name for names in others for name in names], [len(others), *(len(names) for names in others), *members]
+
+
+def hash_filter_args(conditions):
+    args = [len(conditions)]
+    for keep, mapping in conditions:
+        args.extend([int(keep), len(mapping), *mapping])
+        args.extend('' if value is None else value for value in mapping.values())
+    return args
+
+
+SCRIPT_SHAS = {name: sha1(script.encode('utf-8')).hexdigest() for name, script in SCRIPTS.items()}
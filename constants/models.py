@@ -9,6 +9,8 @@ REDIS_INDEX_COUNT = '{hash}-index-{value}_count'
 REDIS_INDEX_POS = '{hash}-index-{value}_size'
 REDIS_INDEX_PARTITION = '{hash}-index-{value}_partition'
 REDIS_UNIQUE_PATTERN = '{hash}-unique-{value}'
+REDIS_ORDERED_PATTERN = '{hash}-ordered-{value}'
+REDIS_LEX_PATTERN = '{hash}-lex-{value}'
 
 DEFAULT_PRIMARY_KEY = 'id'
 UNIQUE_TOGETHER = 'unique_together'
@@ -17,6 +19,16 @@ PRIMARY_KEY = 'primary_key'
 UNIQUE_KEYS = 'unique_keys'
 FOREIGN_KEYS = 'foreign_keys'
 INDEXES_KEYS = 'indexes'
+ORDERED_INDEXES = 'ordered_indexes'
+LEX_INDEXES = 'lex_indexes'
 INDEX_TREE = 'index_tree'
 PRIMARY_POSITION = 'primary_position'
 BIG_KEY_LIMIT = 10000
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_SCAN_COUNT = 1000
+SCAN_PARTITIONS = 16
+REDIS_PRIMARY_VERSION_PATTERN = '{hash}-{primary}-version'
+REDIS_CACHE_CHANNEL = '{hash}-invalidate'
+CACHE = 'cache'
+CACHE_VERSION = 'version'
+CACHE_PUBSUB = 'pubsub'
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from threading import RLock
+from constants.models import CACHE_VERSION, CACHE_PUBSUB
+from exception.exceptions import InvalidInputException
+
+
+class ModelCache:
+    def __init__(self, maxsize=1024, ttl=None, invalidation=CACHE_VERSION):
+        if invalidation not in [CACHE_VERSION, CACHE_PUBSUB, None]:
+            raise InvalidInputException(f'cache invalidation {invalidation}')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.invalidation = invalidation
+        self.subscribed = False
+        self.generation = 0
+        self.values = OrderedDict()
+        self.lock = RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, primary_key, version=None):
+        with self.lock:
+            item = self.values.get(primary_key)
+            if item is not None:
+                expires, cached_version, value = item
+                if (expires is None or expires > time.monotonic()) and cached_version == version:
+                    self.values.move_to_end(primary_key)
+                    self.hits += 1
+                    return value
+                del self.values[primary_key]
+            self.misses += 1
+            return None
+
+    def set(self, primary_key, value, version=None, generation=None):
+        with self.lock:
+            # 读取期间收到过失效通知, 不缓存可能过期的数据
+            if generation is not None and generation != self.generation:
+                return
+            expires = time.monotonic() + self.ttl if self.ttl else None
+            self.values[primary_key] = (expires, version, value)
+            self.values.move_to_end(primary_key)
+            while len(self.values) > self.maxsize:
+                self.values.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, primary_key):
+        with self.lock:
+            self.generation += 1
+            self.values.pop(str(primary_key), None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.values.clear()
+
+    def info(self):
+        with self.lock:
+            return {
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.values), 'maxsize': self.maxsize,
+            }
@@ -0,0 +1,118 @@
+import json
+
+from constants.models import (
+    REDIS_PRIMARY_KEY_PATTERN, REDIS_PRIMARY_DEFAULT_INCR_KEY, REDIS_PRIMARY_PATTERN, REDIS_UNIQUE_PATTERN,
+    REDIS_INDEX_POS, REDIS_INDEX_COUNT, REDIS_INDEX_PARTITION, REDIS_INDEX_PRIMARY_KEY_PATTERN,
+    REDIS_PRIMARY_VERSION_PATTERN, REDIS_CACHE_CHANNEL, REDIS_ORDERED_PATTERN, REDIS_LEX_PATTERN, PRIMARY_POSITION,
+    FOREIGN_KEYS, INDEXES_KEYS, ORDERED_INDEXES, LEX_INDEXES,
+)
+
+PLACEHOLDER = '\0'
+LEX_SEPARATOR = '\0'
+
+
+def key_template(pattern, name, **kwargs):
+    # 预先填好 hash 等固定部分, 运行时只做一次字符串拼接
+    prefix, suffix = pattern.format(**{name: PLACEHOLDER}, **kwargs).split(PLACEHOLDER)
+
+    def build(value):
+        return f'{prefix}{value}{suffix}'
+    return build
+
+
+class ModelKeys:
+    def __init__(self, hash_name):
+        self.hash_name = hash_name
+        self.primary = key_template(REDIS_PRIMARY_KEY_PATTERN, 'primary', hash=hash_name)
+        self.version = key_template(REDIS_PRIMARY_VERSION_PATTERN, 'primary', hash=hash_name)
+        self.unique = key_template(REDIS_UNIQUE_PATTERN, 'value', hash=hash_name)
+        self.index_size = key_template(REDIS_INDEX_POS, 'value', hash=hash_name)
+        self.index_count = key_template(REDIS_INDEX_COUNT, 'value', hash=hash_name)
+        self.index_partition = key_template(REDIS_INDEX_PARTITION, 'value', hash=hash_name)
+        self.index_members = key_template(REDIS_INDEX_PRIMARY_KEY_PATTERN, 'value', hash=hash_name, partition='')
+        self.ordered = key_template(REDIS_ORDERED_PATTERN, 'value', hash=hash_name)
+        self.lex = key_template(REDIS_LEX_PATTERN, 'value', hash=hash_name)
+        self.primary_index = REDIS_PRIMARY_PATTERN.format(hash=hash_name)
+        self.incr = REDIS_PRIMARY_DEFAULT_INCR_KEY.format(hash=hash_name)
+        self.channel = REDIS_CACHE_CHANNEL.format(hash=hash_name)
+
+    def members(self, model_name, value):
+        if model_name == self.hash_name:
+            return self.index_members(value)
+        return REDIS_INDEX_PRIMARY_KEY_PATTERN.format(hash=model_name, value=value, partition='')
+
+
+def build_dumper(fields):
+    dumpers = [(key, field.dump) for key, field in fields.items()]
+
+    def dump_values(values, foreign_keys, indexes, primary_position, ordered_indexes=None, lex_indexes=None):
+        mapping = {PRIMARY_POSITION: primary_position}
+        for key, dump in dumpers:
+            value = dump(values[key])
+            if value is not None:
+                mapping[key] = value
+        if foreign_keys:
+            mapping[FOREIGN_KEYS] = json.dumps(foreign_keys)
+        if indexes:
+            mapping[INDEXES_KEYS] = json.dumps(indexes)
+        if ordered_indexes:
+            mapping[ORDERED_INDEXES] = json.dumps(ordered_indexes)
+        if lex_indexes:
+            mapping[LEX_INDEXES] = json.dumps(lex_indexes)
+        return mapping
+    return dump_values
+
+
+def build_loader(fields, defaults):
+    loaders = [(key, field.load) for key, field in fields.items()]
+
+    def load_values(row):
+        values = defaults.copy()
+        for key, load in loaders:
+            value = row.get(key)
+            if value is not None:
+                values[key] = load(value)
+        return values
+    return load_values
+
+
+def build_key_value_pair(index, fields):
+    parts = [(key, f'{key}-', fields[key].dump) for key in index]
+
+    def key_value_pair(values):
+        return '-'.join([f'{prefix}{dump(values[key])}' for key, prefix, dump in parts])
+    return key_value_pair
+
+
+def ordered_value(key_value_pair, field):
+    # 有序索引的 key: 前缀字段的取值 + 排序字段, 没有前缀时只有排序字段
+    return f'{key_value_pair}-by-{field}' if key_value_pair else f'by-{field}'
+
+
+def build_ordered_scores(ordered_indexes, fields, keys):
+    parts = [
+        (build_key_value_pair(prefix, fields) if prefix else None, field, fields[field].score)
+        for prefix, field in ordered_indexes
+    ]
+
+    def ordered_scores(values):
+        scores = {}
+        for key_value_pair, field, score in parts:
+            value = score(values[field])
+            if value is not None:
+                scores[keys.ordered(ordered_value(key_value_pair and key_value_pair(values), field))] = value
+        return scores
+    return ordered_scores
+
+
+def build_lex_members(lex_indexes, fields, keys):
+    # 字典序索引的成员: 各字段的值与主键用 \0 连接, 分数都为 0, 按成员的字典序排列
+    parts = [(keys.lex('-'.join(index)), [fields[key].dump for key in index], index) for index in lex_indexes]
+
+    def lex_members(values, primary_key):
+        members = {}
+        for name, dumpers, index in parts:
+            dumped = [dump(values[key]) or '' for dump, key in zip(dumpers, index)]
+            members[name] = LEX_SEPARATOR.join([*dumped, str(primary_key)])
+        return members
+    return lex_members
@@ -6,6 +6,7 @@ from datetime import datetime
 from exception.exceptions import InvalidInputException, RedisOrmSystemError
 
 DATETIME_PATTERN = '%Y-%m-%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
 
 
 class FieldMeta(type):
@@ -25,6 +26,18 @@ class FieldABC:
         self.unique = unique
         self.required = required
         self.indexes = []
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return bind(self, instance._values)
+
+    def __set__(self, instance, value):
+        bind(self, instance._values).value = value
 
     @property
     def value(self):
@@ -41,15 +54,83 @@ class FieldABC:
         return True
 
     def serialize(self):
-        raise NotImplementedError
+        return self.dump(self._value)
 
     def deserialize(self, value):
         raise NotImplementedError
 
+    def dump(self, value):
+        # 内部值 -> 存入 redis 的字符串
+        raise NotImplementedError
+
+    def load(self, value):
+        # redis 中读出的字符串 -> 内部值, 数据已在写入时校验过
+        raise NotImplementedError
+
+    def score(self, value):
+        # 内部值 -> sorted set 的分数, 只有可以排序的字段实现, None 表示不加入有序索引
+        raise InvalidInputException(f'{self.name} can not be used in an ordered index')
+
+    def prepare_score(self, value):
+        # 范围查询的参数 -> 分数
+        values = {}
+        bind(self, values).value = value
+        score = self.score(values[self.name])
+        if score is None:
+            raise InvalidInputException(f'{value} can not be compared with {self.name}')
+        return score
+
+    def to_python(self, value):
+        # redis 中读出的字符串 -> 字段的 value, 字段不存在时使用默认值
+        values = {self.name: self._value if value is None else self.load(value)}
+        return bind(self, values).value
+
+    def prepare(self, value):
+        # 查询参数 -> 存入 redis 的字符串, 用于在 redis 端比较
+        values = {}
+        bind(self, values).value = value
+        return self.dump(values[self.name])
+
     def __str__(self):
         return self.serialize()
 
 
+class BoundField:
+    # 字段绑定到某个 model 实例后的视图, 值读写实例自己的 _values, 其余属性取自类上的字段
+    def __init__(self, field, values):
+        object.__setattr__(self, '_field', field)
+        object.__setattr__(self, '_values', values)
+
+    @property
+    def _value(self):
+        return self._values[self._field.name]
+
+    @_value.setter
+    def _value(self, value):
+        self._values[self._field.name] = value
+
+    def __getattr__(self, name):
+        return getattr(self._field, name)
+
+    def __setattr__(self, name, value):
+        if name in ('value', '_value'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._field, name, value)
+
+
+_bound_classes = {}
+
+
+def bind(field, values):
+    field_class = field.__class__
+    bound_class = _bound_classes.get(field_class)
+    if bound_class is None:
+        bound_class = type(f'Bound{field_class.__name__}', (BoundField, field_class), {})
+        _bound_classes[field_class] = bound_class
+    return bound_class(field, values)
+
+
 class IntegerField(FieldABC, metaclass=FieldMeta):
     def __init__(self, default=0, primary=False, unique=False, required=False):
         super().__init__(default, primary, unique, required)
@@ -74,13 +155,26 @@ class IntegerField(FieldABC, metaclass=FieldMeta):
     def check_value(self, value):
         return isinstance(value, int) or (isinstance(value, str) and value.isdigit())
 
-    def serialize(self):
-        return str(self.value)
+    def dump(self, value):
+        assert value is not None
+        return str(int(value))
+
+    def load(self, value):
+        return int(value)
+
+    def score(self, value):
+        return int(value)
 
     def deserialize(self, value):
         self.value = value
 
 
+class CounterField(IntegerField, metaclass=FieldMeta):
+    # 只通过 incr 原子地修改, 不能作为等值索引或唯一键的字段
+    def __init__(self, default=0, required=False):
+        super().__init__(default, False, False, required)
+
+
 class BoolField(FieldABC, metaclass=FieldMeta):
     def __init__(self, default=False, primary=False, unique=False, required=False):
         super().__init__(default, primary, unique, required)
@@ -104,8 +198,14 @@ class BoolField(FieldABC, metaclass=FieldMeta):
     def check_value(self, value):
         return isinstance(value, bool)
 
-    def serialize(self):
-        return '1' if self._value else '0'
+    def dump(self, value):
+        return '1' if value else '0'
+
+    def load(self, value):
+        return value in ['1', 'true', 'True']
+
+    def score(self, value):
+        return 1 if value else 0
 
     def deserialize(self, value):
         self.value = value
@@ -123,8 +223,11 @@ class CharField(FieldABC, metaclass=FieldMeta):
     def value(self, value):
         self._value = str(value)
 
-    def serialize(self):
-        return self._value
+    def dump(self, value):
+        return value
+
+    def load(self, value):
+        return value
 
     def deserialize(self, value):
         self.value = value
@@ -176,10 +279,16 @@ class DatetimeField(FieldABC, metaclass=FieldMeta):
         else:
             raise InvalidInputException(f'{value} should be datetime')
 
-    def serialize(self):
-        if not self.value:
+    def dump(self, value):
+        return value or None
+
+    def load(self, value):
+        return value
+
+    def score(self, value):
+        if not value:
             return None
-        return self._value
+        return int((datetime.strptime(value, DATETIME_PATTERN) - EPOCH).total_seconds())
 
     def deserialize(self, value):
         try:
@@ -215,8 +324,11 @@ class ListField(FieldABC, metaclass=FieldMeta):
         else:
             raise InvalidInputException(f'{value} should be list')
 
-    def serialize(self):
-        return self._value
+    def dump(self, value):
+        return value
+
+    def load(self, value):
+        return value
 
     def deserialize(self, value):
         try:
@@ -250,8 +362,11 @@ class JsonField(FieldABC, metaclass=FieldMeta):
         else:
             raise InvalidInputException(f'{value} should be dict or dict str')
 
-    def serialize(self):
-        return self._value
+    def dump(self, value):
+        return value
+
+    def load(self, value):
+        return value
 
     def deserialize(self, value):
         try:
@@ -276,7 +391,7 @@ class ForeignField(FieldABC, metaclass=FieldMeta):
         if not hasattr(self, 'model'):
             if isinstance(value, BaseModel):
                 self.model = value.__class__
-                self._value = self.retrieve_value(value.__dict__.get(value.primary_key))
+                self._value = self.retrieve_value(getattr(value, value.primary_key).value)
             else:
                 raise InvalidInputException(f'{value} should be other model primary key')
         else:
@@ -284,7 +399,7 @@ class ForeignField(FieldABC, metaclass=FieldMeta):
                 if value.__class__ != self.model:
                     raise InvalidInputException(f'{value} should be other model primary key')
                 else:
-                    self._value = self.retrieve_value(value.__dict__.get(value.primary_key))
+                    self._value = self.retrieve_value(getattr(value, value.primary_key).value)
             elif isinstance(value, int) or isinstance(value, str):
                 self._value = self.retrieve_value(value)
             else:
@@ -297,11 +412,20 @@ class ForeignField(FieldABC, metaclass=FieldMeta):
         else:
             raise InvalidInputException(f'{value} does not exist')
 
+    def prepare(self, value):
+        from .models import BaseModel
+        if isinstance(value, BaseModel):
+            return getattr(value, value.primary_key).value
+        return value
+
     def check_value(self, value):
         return conn.check_name(REDIS_PRIMARY_KEY_PATTERN.format(hash=self.model.Meta.hash_name, primary=value))
 
-    def serialize(self):
-        return self.value
+    def dump(self, value):
+        return value
+
+    def load(self, value):
+        return value
 
     def deserialize(self, value):
         self.value = value
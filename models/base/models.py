@@ -1,17 +1,28 @@
-import copy
+import asyncio
 import json
-from models.base.fields import FieldABC, IntegerField, ForeignField, DatetimeField
-from client import conn
+from functools import partial
+from itertools import islice, chain
+from models.base.cache import ModelCache
+from models.base.codecs import (
+    ModelKeys, build_dumper, build_loader, build_key_value_pair, build_ordered_scores, ordered_value,
+    build_lex_members, LEX_SEPARATOR,
+)
+from models.base.query import QuerySet, ScorePages, LexPages, tighter, score_arg, lex_arg
+from models.base.fields import FieldABC, IntegerField, ForeignField, DatetimeField, BoolField, CounterField
+from client import conn, aconn
 from constants.models import (
-    REDIS_PRIMARY_DEFAULT_INCR_KEY, DEFAULT_PRIMARY_KEY, UNIQUE_TOGETHER, CONCRETE_FIELDS, PRIMARY_KEY, UNIQUE_KEYS,
-    FOREIGN_KEYS, INDEXES_KEYS, REDIS_UNIQUE_PATTERN, REDIS_INDEX_PARTITION, REDIS_INDEX_COUNT,
-    REDIS_INDEX_POS, BIG_KEY_LIMIT, REDIS_INDEX_PRIMARY_KEY_PATTERN, REDIS_PRIMARY_KEY_PATTERN, INDEX_TREE,
-    REDIS_PRIMARY_FOREIGN_VALUE_PATTERN, REDIS_PRIMARY_PATTERN, PRIMARY_POSITION,
+    DEFAULT_PRIMARY_KEY, UNIQUE_TOGETHER, CONCRETE_FIELDS, PRIMARY_KEY, UNIQUE_KEYS, FOREIGN_KEYS, INDEXES_KEYS,
+    BIG_KEY_LIMIT, REDIS_PRIMARY_KEY_PATTERN, INDEX_TREE, REDIS_PRIMARY_FOREIGN_VALUE_PATTERN, PRIMARY_POSITION,
+    DEFAULT_BATCH_SIZE, CACHE, CACHE_VERSION, CACHE_PUBSUB, DEFAULT_SCAN_COUNT, SCAN_PARTITIONS, ORDERED_INDEXES,
+    LEX_INDEXES,
 )
 from exception.exceptions import (
     ObjectNotFoundException, ValueRequiredException, GetMoreObjectsException, InvalidInputException,
     DuplicatedValueError,
 )
+STORED_KEYS = [FOREIGN_KEYS, INDEXES_KEYS, ORDERED_INDEXES, LEX_INDEXES, PRIMARY_POSITION]
+UPDATE_KEYS = [INDEXES_KEYS, ORDERED_INDEXES, LEX_INDEXES, PRIMARY_POSITION]
+
 
 class Trie:
     def __init__(self):
@@ -34,6 +45,31 @@ class Trie:
             tree = tree[word]
         return indexes
 
+    def paths(self, words, tree=None, path=()):
+        # 只沿 words 中存在的分支向下走, 代价取决于 trie 的节点数而不是 words 的排列数
+        tree = self.lookup if tree is None else tree
+        paths = []
+        for word, child in tree.items():
+            if word in words:
+                paths.append([*path, word])
+                paths.extend(self.paths(words, child, (*path, word)))
+        return paths
+
+
+class hybridmethod:
+    # 在实例上调用 func, 在类上调用 class_func, 用法与 property.setter 相同
+    def __init__(self, func, class_func=None):
+        self.func = func
+        self.class_func = class_func
+
+    def classmethod(self, class_func):
+        return hybridmethod(self.func, class_func)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return partial(self.class_func, owner)
+        return partial(self.func, instance)
+
 
 class ModelMeta(type):
     def __new__(cls, name, bases, attrs):
@@ -58,6 +94,7 @@ class ModelMeta(type):
                     foreign_keys.append(key)
         if not primary_count:
             primary_value = IntegerField(primary=True)
+            primary_value.__set_name__(new_class, DEFAULT_PRIMARY_KEY)
             _concrete_field[DEFAULT_PRIMARY_KEY] = primary_value
             setattr(new_class, DEFAULT_PRIMARY_KEY, primary_value)
         unique_keys = [sorted(item) for item in uniques]
@@ -83,11 +120,64 @@ class ModelMeta(type):
                     root.insert(tmp_index.copy())
                     indexes.append(tmp_index.copy())
         setattr(new_class, INDEX_TREE, root)
+        setattr(new_class, '_index_plans', {})
         for index in indexes:
             for element in index:
                 value: FieldABC = getattr(new_class, element)
                 value.indexes.append(index)
         setattr(new_class, INDEXES_KEYS, indexes)
+        # 有序索引: 最后一个字段是排序字段, 前面的字段按等值匹配, '-' 只表示常用的方向, 两个方向都可以读取
+        ordered_indexes = []
+        for ordered_index in getattr(new_class.Meta, ORDERED_INDEXES, []):
+            *prefix, field = ordered_index
+            field = field.lstrip('-')
+            for element in [*prefix, field]:
+                if element not in _concrete_field:
+                    raise InvalidInputException(f'{element} is not a field of {name}')
+            if not isinstance(_concrete_field[field], (IntegerField, BoolField, DatetimeField)):
+                raise InvalidInputException(f'{field} can not be used in an ordered index')
+            ordered_indexes.append((list(prefix), field))
+        setattr(new_class, '_ordered_indexes', ordered_indexes)
+        # 字典序索引: 可以按任一字段做前缀或字典序范围查询, 该字段之前的字段需要等值匹配
+        lex_indexes = [list(index) for index in getattr(new_class.Meta, LEX_INDEXES, [])]
+        for element in [element for index in lex_indexes for element in index]:
+            if element not in _concrete_field:
+                raise InvalidInputException(f'{element} is not a field of {name}')
+        setattr(new_class, '_lex_indexes', lex_indexes)
+        # 计数字段由 HINCRBY 修改, 只能作为有序索引的排序字段, 脚本按 sorted set 名字的后缀更新分数
+        counters = {}
+        for key, value in _concrete_field.items():
+            if not isinstance(value, CounterField):
+                continue
+            if any(key in index for index in indexes + lex_indexes + [prefix for prefix, _ in ordered_indexes]):
+                raise InvalidInputException(f'{key} is a CounterField, it can only be the field of an ordered index')
+            ordered = any(field == key for _, field in ordered_indexes)
+            counters[key] = f'-{ordered_value(None, key)}' if ordered else ''
+        setattr(new_class, '_counters', counters)
+        cache = getattr(new_class.Meta, CACHE, None)
+        setattr(new_class, '_cache', ModelCache(**cache) if cache else None)
+        # 编解码与 key 拼接在类创建时生成一次, 读写路径上不再逐字段分派
+        defaults = {key: value._value for key, value in _concrete_field.items()}
+        hash_name = getattr(new_class.Meta, 'hash_name', None)
+        setattr(new_class, '_keys', ModelKeys(hash_name) if hash_name else None)
+        setattr(new_class, '_default_values', defaults)
+        setattr(new_class, '_dump_values', staticmethod(build_dumper(_concrete_field)))
+        setattr(new_class, '_load_values', staticmethod(build_loader(_concrete_field, defaults)))
+        setattr(new_class, '_unique_key_value_pairs', [
+            build_key_value_pair(unique, _concrete_field) for unique in unique_keys
+        ])
+        setattr(new_class, '_index_key_value_pairs', [
+            build_key_value_pair(index, _concrete_field) for index in indexes
+        ])
+        setattr(new_class, '_ordered_scores', staticmethod(
+            build_ordered_scores(ordered_indexes, _concrete_field, new_class._keys)
+        ))
+        setattr(new_class, '_lex_members', staticmethod(
+            build_lex_members(lex_indexes, _concrete_field, new_class._keys)
+        ))
+        setattr(new_class, '_datetime_fields', [
+            key for key, value in _concrete_field.items() if isinstance(value, DatetimeField)
+        ])
         return new_class
 
     def __init__(cls, name, bases, attrs):
@@ -96,235 +186,858 @@ class ModelMeta(type):
 
 class BaseModel(object, metaclass=ModelMeta):
     def __init__(self, **kwargs):
+        # 字段是类上的描述符, 实例只保存各字段的值
+        self._values = self._default_values.copy()
+        # _stored 为最近一次读取或保存时的值, 用来找出修改过的字段, None 表示还没有保存过
+        self._stored = None
+        # only() 没有读取的字段, 保存或删除前从 redis 补齐
+        self._deferred = []
         for key, value in getattr(self, CONCRETE_FIELDS).items():
-            if isinstance(value, FieldABC):
-                if value.primary:
-                    if key in kwargs:
-                        value._value = kwargs.get(key)
-                    else:
-                        value._value = 0
-                elif key in kwargs:
-                    value.value = kwargs.get(key)
-                elif value.required:
-                    raise ValueRequiredException(key)
-            setattr(self, key, copy.deepcopy(value))
-
-    def _hset(self, name, key, value):
-        if isinstance(value, dict):
-            conn.set_hash(name, key, json.dumps(value))
-        elif isinstance(value, list):
-            conn.set_hash(name, key, json.dumps(value))
-        elif isinstance(value, str):
-            conn.set_hash(name, key, value)
-        elif isinstance(value, int):
-            conn.set_hash(name, key, value)
-
-    def _retrieve_key_value_from_name(self, name):
-        if hasattr(self, name):
-            value: FieldABC = getattr(self, name)
-            assert isinstance(value, FieldABC)
-            return name, value.serialize()
-        else:
-            return None, None
+            if value.primary:
+                self._values[key] = kwargs.get(key, 0)
+            elif key in kwargs:
+                setattr(self, key, kwargs.get(key))
+            elif value.required:
+                raise ValueRequiredException(key)
 
-    def _set_big_keys(self, model_name, primary_key, value):
-        position = conn.increase_by_name(REDIS_INDEX_POS.format(hash=self.Meta.hash_name, value=value))
-        conn.increase_by_name(REDIS_INDEX_COUNT.format(hash=self.Meta.hash_name, value=value))
-        if position % BIG_KEY_LIMIT == 1:
-            partition = conn.increase_by_name(REDIS_INDEX_PARTITION.format(hash=self.Meta.hash_name, value=value))
-        else:
-            partition = conn.get_by_name(REDIS_INDEX_PARTITION.format(hash=self.Meta.hash_name, value=value))
-        conn.set_hash(
-            REDIS_INDEX_PRIMARY_KEY_PATTERN.format(hash=model_name, value=value, partition=partition),
-            f'{self.Meta.hash_name}-{primary_key}', 1
+    @classmethod
+    def _set_big_keys(cls, pipe, model_name, primary_keys, value):
+        keys: ModelKeys = cls._keys
+        pipe.add_index_members(
+            keys.index_size(value), keys.index_count(value), keys.index_partition(value),
+            keys.members(model_name, value), [keys.primary(primary_key) for primary_key in primary_keys],
+            BIG_KEY_LIMIT
         )
-        return partition
 
-    def _delete_big_keys(self, model_name, primary_key, value, partition):
-        conn.decrease_by_name(REDIS_INDEX_COUNT.format(hash=self.Meta.hash_name, value=value))
-        conn.delete_hash_by_name_and_key(
-            REDIS_INDEX_PRIMARY_KEY_PATTERN.format(hash=model_name, value=value, partition=partition),
-            f'{self.Meta.hash_name}-{primary_key}'
+    def _delete_big_keys(self, pipe, model_name, primary_key, value, partition):
+        keys: ModelKeys = self._keys
+        pipe.remove_index_members(
+            keys.index_count(value), f'{keys.members(model_name, value)}{partition}', [keys.primary(primary_key)]
         )
 
-    def _save_unique_index(self, unique, primary_key):
-        if isinstance(unique, list):
-            key_value_pair = []
-            for key in unique:
-                key_value_pair.append('-'.join(self._retrieve_key_value_from_name(key)))
-            key_value_pair = '-'.join(key_value_pair)
-            if not conn.set_value_if_name_not_exists(REDIS_UNIQUE_PATTERN.format(hash=self.Meta.hash_name, value=key_value_pair), primary_key):
-                raise DuplicatedValueError(unique)
-        elif isinstance(unique, str) or isinstance(unique, int):
-            key_value_pair = '-'.join(self._retrieve_key_value_from_name(unique))
-            if not conn.set_value_if_name_not_exists(REDIS_UNIQUE_PATTERN.format(hash=self.Meta.hash_name, value=key_value_pair), primary_key):
-                raise DuplicatedValueError(unique)
-
-    def _save_primary(self, primary_key):
-        return self._set_big_keys(model_name=self.Meta.hash_name, primary_key=primary_key, value=REDIS_PRIMARY_PATTERN.format(hash=self.Meta.hash_name))
+    def _unique_names(self):
+        return [self._keys.unique(key_value_pair(self._values)) for key_value_pair in self._unique_key_value_pairs]
 
-    def _delete_primary(self, primary_key, partition):
-        self._delete_big_keys(model_name=self.Meta.hash_name, primary_key=primary_key, value=REDIS_PRIMARY_PATTERN.format(hash=self.Meta.hash_name), partition=partition)
+    def _save_unique_indexes(self, pipe, primary_key):
+        unique_names = self._unique_names()
+        for unique_name in unique_names:
+            pipe.set_value_if_name_not_exists(unique_name, primary_key)
+        return unique_names
 
-    def _save_index(self, primary_key, index):
-        key_value_pair = []
-        for element in index:
-            key_value_pair.append('-'.join(self._retrieve_key_value_from_name(element)))
-        key_value_pair = '-'.join(key_value_pair)
-        return key_value_pair, self._set_big_keys(model_name=self.Meta.hash_name, primary_key=primary_key, value=key_value_pair)
+    def _index_values(self):
+        return [key_value_pair(self._values) for key_value_pair in self._index_key_value_pairs]
 
-    def _save_indexes(self, primary_key):
+    def _save_indexes(self, pipe, primary_key, index_values):
         # 没有级联删除，只能手动删除
-        for unique in getattr(self, UNIQUE_KEYS):
-            self._save_unique_index(unique, primary_key)
-        index_partitions = {}
-        for index in getattr(self, INDEXES_KEYS):
-            key, value = self._save_index(primary_key, index)
-            index_partitions[key] = value
-        return index_partitions
-
-    @classmethod
-    def _get_index(cls, index, params):
-        key_value_pair = []
-        for key in index:
-            key_value_pair.append('-'.join([key, f'{params.get(key)}']))
-        key_value_pair = '-'.join(key_value_pair)
-        result = []
-        primary_names = conn.get_by_name(REDIS_UNIQUE_PATTERN.format(hash=cls.Meta.hash_name, value=key_value_pair))
-        if primary_names:
-            result.append(primary_names)
-        else:
-            partition = int(conn.get_by_name(REDIS_INDEX_PARTITION.format(hash=cls.Meta.hash_name, value=key_value_pair)))
-            for i in range(1, partition+1):
-                results = conn.get_all_hash_by_name(REDIS_INDEX_PRIMARY_KEY_PATTERN.format(hash=cls.Meta.hash_name, value=key_value_pair, partition=partition))
-                if results:
-                    for key, _ in results.items():
-                        result.append(key[len(cls.Meta.hash_name) + 1:])
-        return result
+        for value in index_values:
+            self._set_big_keys(pipe, model_name=self.Meta.hash_name, primary_keys=[primary_key], value=value)
 
-    def _delete_unique_index(self, unique):
-        if isinstance(unique, list):
-            key_value_pair = []
-            for key in unique:
-                key_value_pair.append('-'.join(self._retrieve_key_value_from_name(key)))
-            key_value_pair = '-'.join(key_value_pair)
-            conn.delete_by_name(REDIS_UNIQUE_PATTERN.format(hash=self.Meta.hash_name, value=key_value_pair))
-        else:
-            key_value_pair = '-'.join(self._retrieve_key_value_from_name(unique))
-            conn.delete_by_name(REDIS_UNIQUE_PATTERN.format(hash=self.Meta.hash_name, value=key_value_pair))
-
-    def _delete_index(self, primary_key, index, partitions):
-        key_value_pair = []
-        for element in index:
-            key_value_pair.append('-'.join(self._retrieve_key_value_from_name(element)))
-        key_value_pair = '-'.join(key_value_pair)
-        if key_value_pair in partitions:
+    def _delete_unique_indexes(self, pipe):
+        unique_names = self._unique_names()
+        if unique_names:
+            pipe.unlink_by_names(unique_names)
+
+    def _delete_indexes(self, pipe, primary_key, partitions):
+        for value, partition in partitions.items():
             self._delete_big_keys(
-                model_name=self.Meta.hash_name, primary_key=primary_key, value=key_value_pair,
-                partition=partitions.get(key_value_pair)
+                pipe, model_name=self.Meta.hash_name, primary_key=primary_key, value=value, partition=partition
             )
-        del partitions[key_value_pair]
 
-    def _delete_indexes(self, primary_key, partitions):
-        for unique in getattr(self, UNIQUE_KEYS):
-            self._delete_unique_index(unique)
-        if not partitions:
+    @staticmethod
+    def _save_ordered_indexes(pipe, primary_key, ordered_scores):
+        for name, score in ordered_scores.items():
+            pipe.add_sorted_members(name, {primary_key: score})
+
+    @staticmethod
+    def _delete_ordered_indexes(pipe, primary_key, names):
+        for name in names:
+            pipe.remove_sorted_members(name, [primary_key])
+
+    @staticmethod
+    def _save_lex_indexes(pipe, lex_members):
+        for name, member in lex_members.items():
+            pipe.add_sorted_members(name, {member: 0})
+
+    @staticmethod
+    def _delete_lex_indexes(pipe, lex_members):
+        for name, member in lex_members.items():
+            pipe.remove_sorted_members(name, [member])
+
+    @classmethod
+    def _params_key_value_pair(cls, index, params):
+        # 查询值与写入时一样先转换成存入 redis 的字符串, 再拼接索引与唯一键的 key
+        prepared = cls._prepare_params({key: params.get(key) for key in index})
+        return '-'.join(f'{key}-{prepared[key]}' for key in index)
+
+    @classmethod
+    def _get_index(cls, indexes, params):
+        return list(cls._iter_index(indexes, params))
+
+    @classmethod
+    def _partition_names(cls, key_value_pair, partition):
+        return [f'{cls._keys.index_members(key_value_pair)}{i}' for i in range(1, partition + 1)]
+
+    @classmethod
+    def _scan_batches(cls, partition_names):
+        # 每次最多同时扫描 SCAN_PARTITIONS 个分区, 每个分区一次最多返回约 DEFAULT_SCAN_COUNT 个成员
+        pending = list(reversed(partition_names))
+        cursors = {}
+        while pending or cursors:
+            while pending and len(cursors) < SCAN_PARTITIONS:
+                cursors[pending.pop()] = 0
+            yield cursors
+            cursors = {name: cursor for name, cursor in cursors.items() if cursor}
+
+    @classmethod
+    def _scan_members(cls, partition_names):
+        # HSCAN 按游标分批读取, 同一批次的所有分区在一个 pipeline 中读取, 每批生成一个成员列表
+        for cursors in cls._scan_batches(partition_names):
+            with conn.pipeline() as pipe:
+                for name, cursor in cursors.items():
+                    pipe.scan_hash_by_name(name, cursor, DEFAULT_SCAN_COUNT)
+            batch = []
+            for name, (cursor, members) in zip(list(cursors), pipe.results):
+                cursors[name] = int(cursor)
+                batch.extend(members)
+            yield batch
+
+    @classmethod
+    async def _ascan_members(cls, partition_names):
+        for cursors in cls._scan_batches(partition_names):
+            async with aconn.pipeline() as pipe:
+                for name, cursor in cursors.items():
+                    pipe.scan_hash_by_name(name, cursor, DEFAULT_SCAN_COUNT)
+            batch = []
+            for name, (cursor, members) in zip(list(cursors), pipe.results):
+                cursors[name] = int(cursor)
+                batch.extend(members)
+            yield batch
+
+    @classmethod
+    def _scan_partitions(cls, partition_names):
+        for members in cls._scan_members(partition_names):
+            for key in members:
+                yield key[len(cls.Meta.hash_name) + 1:]
+
+    @classmethod
+    async def _ascan_partitions(cls, partition_names):
+        async for members in cls._ascan_members(partition_names):
+            for key in members:
+                yield key[len(cls.Meta.hash_name) + 1:]
+
+    @staticmethod
+    def _queue_intersect(pipe, members, others):
+        # 每次脚本调用只检查 DEFAULT_SCAN_COUNT 个成员, 不会长时间阻塞 redis
+        for start in range(0, len(members), DEFAULT_SCAN_COUNT):
+            pipe.intersect_index_members(members[start:start + DEFAULT_SCAN_COUNT], others)
+
+    @classmethod
+    def _intersect_partitions(cls, partition_names, others):
+        # HSCAN 读到的每批成员在 redis 端与其他索引的分区求交集
+        for members in cls._scan_members(partition_names):
+            if not members:
+                continue
+            with conn.pipeline() as pipe:
+                cls._queue_intersect(pipe, members, others)
+            for matched in pipe.results:
+                for key in matched:
+                    yield key[len(cls.Meta.hash_name) + 1:]
+
+    @classmethod
+    async def _aintersect_partitions(cls, partition_names, others):
+        async for members in cls._ascan_members(partition_names):
+            if not members:
+                continue
+            async with aconn.pipeline() as pipe:
+                cls._queue_intersect(pipe, members, others)
+            for matched in pipe.results:
+                for key in matched:
+                    yield key[len(cls.Meta.hash_name) + 1:]
+
+    @classmethod
+    def _index_sources(cls, indexes, params, partitions):
+        # 第一个索引行数最少, 只遍历它的分区, 其余索引的所有分区只用来判断成员是否存在
+        key_value_pairs = [cls._params_key_value_pair(index, params) for index in indexes] or [cls._keys.primary_index]
+        partitions = [int(partition or 0) for partition in partitions]
+        others = [
+            cls._partition_names(key_value_pair, partition)
+            for key_value_pair, partition in zip(key_value_pairs[1:], partitions[1:])
+        ]
+        return cls._partition_names(key_value_pairs[0], partitions[0]), others
+
+    @classmethod
+    def _partition_counters(cls, indexes, params):
+        key_value_pairs = [cls._params_key_value_pair(index, params) for index in indexes] or [cls._keys.primary_index]
+        return [cls._keys.index_partition(key_value_pair) for key_value_pair in key_value_pairs]
+
+    @classmethod
+    def _iter_index(cls, indexes, params):
+        # 没有可用索引时遍历 primary 索引, 即扫描全部对象
+        if indexes and indexes[0] in getattr(cls, UNIQUE_KEYS):
+            primary_key = conn.get_by_name(cls._keys.unique(cls._params_key_value_pair(indexes[0], params)))
+            if primary_key:
+                yield primary_key
             return
-        partitions = json.loads(partitions)
-        for index in getattr(self, INDEXES_KEYS):
-            self._delete_index(primary_key, index, partitions)
-
-    def _save_foreign_key(self, primary_key: str, foreign_key: ForeignField):
-        foreign_name = foreign_key.model.Meta.hash_name
-        assert conn.check_name(REDIS_PRIMARY_KEY_PATTERN.format(hash=foreign_name, primary=foreign_key.value))
-        partition = self._set_big_keys(
-            model_name=foreign_name, primary_key=primary_key, value=foreign_key.value
-        )
-        return REDIS_PRIMARY_FOREIGN_VALUE_PATTERN.format(
-            has=self.Meta.hash_name, foreign=foreign_name, value=foreign_key.value), partition
+        partitions = conn.get_by_names(cls._partition_counters(indexes, params))
+        partition_names, others = cls._index_sources(indexes, params, partitions)
+        if not others:
+            yield from cls._scan_partitions(partition_names)
+        elif all(others):
+            yield from cls._intersect_partitions(partition_names, others)
+
+    @classmethod
+    async def _aiter_index(cls, indexes, params):
+        if indexes and indexes[0] in getattr(cls, UNIQUE_KEYS):
+            primary_key = await aconn.get_by_name(cls._keys.unique(cls._params_key_value_pair(indexes[0], params)))
+            if primary_key:
+                yield primary_key
+            return
+        partitions = await aconn.get_by_names(cls._partition_counters(indexes, params))
+        partition_names, others = cls._index_sources(indexes, params, partitions)
+        if not others:
+            async for primary_key in cls._ascan_partitions(partition_names):
+                yield primary_key
+        elif all(others):
+            async for primary_key in cls._aintersect_partitions(partition_names, others):
+                yield primary_key
 
-    def _save_foreign_keys(self, primary_key):  # key job_id, foreign_key: process_id
-        foreign_partitions = {}
-        _concrete_fields = self.__dict__
+    def _foreign_values(self):
+        foreign_values = []
         for foreign_key in getattr(self, FOREIGN_KEYS):
-            _foreign_key: ForeignField = _concrete_fields.get(foreign_key, '')
-            key, value = self._save_foreign_key(primary_key, _foreign_key)
-            foreign_partitions[key] = value
-        return foreign_partitions
+            _foreign_key: ForeignField = getattr(self, foreign_key)
+            foreign_name = _foreign_key.model.Meta.hash_name
+            foreign_values.append((
+                REDIS_PRIMARY_FOREIGN_VALUE_PATTERN.format(
+                    hash=self.Meta.hash_name, foreign=foreign_name, value=_foreign_key.value),
+                foreign_name, _foreign_key.value
+            ))
+        return foreign_values
+
+    def _check_foreign_keys(self, pipe, foreign_values):
+        for _, foreign_name, value in foreign_values:
+            pipe.check_name(REDIS_PRIMARY_KEY_PATTERN.format(hash=foreign_name, primary=value))
+
+    def _save_foreign_keys(self, pipe, primary_key, foreign_values):  # key 如 job_id, foreign_key 如 process_id
+        for _, foreign_name, value in foreign_values:
+            self._set_big_keys(pipe, model_name=foreign_name, primary_keys=[primary_key], value=value)
+
+    def _delete_foreign_keys(self, pipe, primary_key, partitions):
+        for key, foreign_name, value in self._foreign_values():
+            if key in partitions:
+                self._delete_big_keys(
+                    pipe, model_name=foreign_name, primary_key=primary_key, value=value, partition=partitions[key]
+                )
+
+    def _save_primary(self, pipe, primary_key):
+        self._set_big_keys(
+            pipe, model_name=self.Meta.hash_name, primary_keys=[primary_key],
+            value=self._keys.primary_index
+        )
 
-    def _delete_foreign_key(self, partitions, foreign_key, primary_key):
+    def _delete_primary(self, pipe, primary_key, partition):
         self._delete_big_keys(
-            model_name=foreign_key.model.Meta.hash_name, primary_key=primary_key, value=foreign_key.value,
-            partition=partitions.get(foreign_key.value)
+            pipe, model_name=self.Meta.hash_name, primary_key=primary_key,
+            value=self._keys.primary_index, partition=partition
         )
-        del partitions[foreign_key.value]
 
-    def _delete_foreign_keys(self, primary_name, primary_key, partitions):
-        if not partitions:
+    @classmethod
+    def _queue_invalidate(cls, pipe, primary_key, deleted=False):
+        cache: ModelCache = cls._cache
+        if cache is None:
             return
-        partitions = json.loads(partitions)
-        _concrete_fields = self.__dict__
-        for foreign_key in getattr(self, FOREIGN_KEYS):
-            _foreign_key: ForeignField = _concrete_fields.get(foreign_key, '')
-            if _foreign_key.value in partitions:
-               self._delete_foreign_key(partitions, foreign_key, primary_key)
-        self._save_model(primary_name, FOREIGN_KEYS, json.dumps(partitions))
-
-    def _save_model(self, name, key, value):
-        if isinstance(value, dict):
-            conn.set_hash(name, key, json.dumps(value))
-        elif isinstance(value, list):
-            conn.set_hash(name, key, json.dumps(value))
-        elif isinstance(value, str):
-            conn.set_hash(name, key, value)
-        elif isinstance(value, int):
-            conn.set_hash(name, key, value)
-
-    def _create_new(self, primary_key, primary_name, _concrete_fields):
-        for field in _concrete_fields:
-            model_field = getattr(self, field)
-            if isinstance(model_field, DatetimeField):
-                model_field.deal()
-        foreign_keys = self._save_foreign_keys(primary_key=primary_key)
-        indexes = self._save_indexes(primary_key=primary_key)
-        primary_position = self._save_primary(primary_key=primary_key)
-        self._save_model(primary_name, PRIMARY_POSITION, primary_position)
-        for key, value in _concrete_fields.items():
-            if isinstance(value, DatetimeField):
-                self._save_model(primary_name, key, value.serialize())
+        if cache.invalidation == CACHE_VERSION:
+            # 缓存项有 ttl 时, 删除对象后 version key 在同样的时间后过期, 此时旧版本的缓存项都已失效
+            # 重新写入时去掉过期时间; 没有 ttl 的缓存项永不过期, version key 也必须保留, 否则版本号从头开始与旧的缓存项相同
+            version_name = cls._keys.version(primary_key)
+            pipe.increase_by_name(version_name)
+            if cache.ttl and deleted:
+                pipe.expire_by_name(version_name, cache.ttl)
+            elif cache.ttl:
+                pipe.persist_by_name(version_name)
+        elif cache.invalidation == CACHE_PUBSUB:
+            pipe.publish(cls._keys.channel, primary_key)
+
+    @classmethod
+    def _invalidate_cache(cls, primary_key):
+        if cls._cache is not None:
+            cls._cache.invalidate(primary_key)
+
+    def _delete_stored(self, pipe, primary_key, primary_name, stored):
+        foreign_keys, indexes, ordered_indexes, lex_indexes, primary_position = stored
+        self._delete_foreign_keys(pipe, primary_key, json.loads(foreign_keys) if foreign_keys else {})
+        self._delete_unique_indexes(pipe)
+        self._delete_indexes(pipe, primary_key, json.loads(indexes) if indexes else {})
+        self._delete_ordered_indexes(pipe, primary_key, json.loads(ordered_indexes) if ordered_indexes else [])
+        self._delete_lex_indexes(pipe, json.loads(lex_indexes) if lex_indexes else {})
+        self._delete_primary(pipe, primary_key, primary_position)
+        pipe.unlink_by_names([primary_name])
+
+    def _deal_fields(self):
+        for field in self._datetime_fields:
+            getattr(self, field).deal()
+
+    def _build_model(self, foreign_keys, indexes, primary_position, ordered_indexes=None, lex_indexes=None):
+        return self._dump_values(self._values, foreign_keys, indexes, primary_position, ordered_indexes, lex_indexes)
+
+    def _queue_create(self, pipe, primary_key, primary_name, stored):
+        self._deal_fields()
+        foreign_values = self._foreign_values()
+        index_values = self._index_values()
+        if stored:
+            self._delete_stored(pipe, primary_key, primary_name, stored)
+        self._check_foreign_keys(pipe, foreign_values)
+        unique_names = self._save_unique_indexes(pipe, primary_key)
+        self._save_foreign_keys(pipe, primary_key, foreign_values)
+        self._save_indexes(pipe, primary_key, index_values)
+        self._save_primary(pipe, primary_key)
+        return foreign_values, index_values, unique_names
+
+    def _parse_create(self, results, foreign_values, index_values, unique_names):
+        foreign_count, unique_count = len(foreign_values), len(unique_names)
+        results = results[-(foreign_count * 2 + unique_count + len(index_values) + 1):]
+        checks = results[:foreign_count]
+        created = results[foreign_count:foreign_count + unique_count]
+        partitions = [partition for partition, in results[foreign_count + unique_count:]]
+        foreign_keys = {key: partition for (key, _, _), partition in zip(foreign_values, partitions)}
+        indexes = dict(zip(index_values, partitions[foreign_count:-1]))
+        return checks, created, foreign_keys, indexes, partitions[-1]
+
+    def _queue_rollback(self, pipe, primary_key, unique_names, created, foreign_keys, indexes, primary_position):
+        reserved = [name for name, result in zip(unique_names, created) if result]
+        if reserved:
+            pipe.unlink_by_names(reserved)
+        self._delete_foreign_keys(pipe, primary_key, foreign_keys)
+        self._delete_indexes(pipe, primary_key, indexes)
+        self._delete_primary(pipe, primary_key, primary_position)
+        self._queue_invalidate(pipe, primary_key, deleted=True)
+
+    def _raise_create_error(self, checks, created):
+        assert all(checks)
+        for unique, result in zip(getattr(self, UNIQUE_KEYS), created):
+            if not result:
+                raise DuplicatedValueError(unique)
+
+    def _create_new(self, primary_key, primary_name, stored=None):
+        # 第一批: 删除旧数据, 检查外键, 占用唯一键并写入所有 big key
+        with conn.pipeline() as pipe:
+            foreign_values, index_values, unique_names = self._queue_create(
+                pipe, primary_key, primary_name, stored
+            )
+        checks, created, foreign_keys, indexes, primary_position = self._parse_create(
+            pipe.results, foreign_values, index_values, unique_names
+        )
+        if not all(checks) or not all(created):
+            with conn.pipeline() as pipe:
+                self._queue_rollback(pipe, primary_key, unique_names, created, foreign_keys, indexes, primary_position)
+            self._invalidate_cache(primary_key)
+            self._raise_create_error(checks, created)
+        # 第二批: 写入 model 本身与有序索引
+        ordered_scores = self._ordered_scores(self._values)
+        lex_members = self._lex_members(self._values, primary_key)
+        with conn.pipeline() as pipe:
+            pipe.set_hash_mapping(primary_name, self._build_model(
+                foreign_keys, indexes, primary_position, list(ordered_scores), lex_members
+            ))
+            self._save_ordered_indexes(pipe, primary_key, ordered_scores)
+            self._save_lex_indexes(pipe, lex_members)
+            self._queue_invalidate(pipe, primary_key)
+        self._invalidate_cache(primary_key)
+
+    async def _acreate_new(self, primary_key, primary_name, stored=None):
+        async with aconn.pipeline() as pipe:
+            foreign_values, index_values, unique_names = self._queue_create(
+                pipe, primary_key, primary_name, stored
+            )
+        checks, created, foreign_keys, indexes, primary_position = self._parse_create(
+            pipe.results, foreign_values, index_values, unique_names
+        )
+        if not all(checks) or not all(created):
+            async with aconn.pipeline() as pipe:
+                self._queue_rollback(pipe, primary_key, unique_names, created, foreign_keys, indexes, primary_position)
+            self._invalidate_cache(primary_key)
+            self._raise_create_error(checks, created)
+        ordered_scores = self._ordered_scores(self._values)
+        lex_members = self._lex_members(self._values, primary_key)
+        async with aconn.pipeline() as pipe:
+            pipe.set_hash_mapping(primary_name, self._build_model(
+                foreign_keys, indexes, primary_position, list(ordered_scores), lex_members
+            ))
+            self._save_ordered_indexes(pipe, primary_key, ordered_scores)
+            self._save_lex_indexes(pipe, lex_members)
+            self._queue_invalidate(pipe, primary_key)
+        self._invalidate_cache(primary_key)
+
+    @classmethod
+    def _bulk_create_batch(cls, objs, seen):
+        # 第一批: 检查主键与外键, 一次占用整批的唯一键
+        # seen 为这次 bulk_create 已经出现过的主键, 重复的行不发出命令, 主键记为 None, 与已存在的主键一样失败
+        rows = []
+        with conn.pipeline() as pipe:
+            for obj in objs:
+                obj._deal_fields()
+                primary_key = getattr(obj, cls.primary_key).value
+                if str(primary_key) in seen:
+                    rows.append((obj, None, None, [], []))
+                    continue
+                seen.add(str(primary_key))
+                primary_name = cls._keys.primary(primary_key)
+                foreign_values = obj._foreign_values()
+                pipe.check_hash_by_name_and_key(primary_name, cls.primary_key)
+                obj._check_foreign_keys(pipe, foreign_values)
+                unique_names = obj._save_unique_indexes(pipe, primary_key)
+                rows.append((obj, primary_key, primary_name, foreign_values, unique_names))
+        results = iter(pipe.results)
+        valid_rows, failed, released = [], [], []
+        for obj, primary_key, primary_name, foreign_values, unique_names in rows:
+            exists = primary_key is None or next(results)
+            checks = [next(results) for _ in foreign_values]
+            created = [next(results) for _ in unique_names]
+            error = None
+            if exists:
+                error = DuplicatedValueError(cls.primary_key)
+            elif not all(checks):
+                error = InvalidInputException(f'{getattr(cls, FOREIGN_KEYS)} should exist')
+            elif not all(created):
+                error = DuplicatedValueError(
+                    next(unique for unique, result in zip(getattr(cls, UNIQUE_KEYS), created) if not result)
+                )
+            if error:
+                failed.append((obj, error))
+                released.extend(name for name, result in zip(unique_names, created) if result)
             else:
-                self._save_model(primary_name, key, value.serialize())
-        if foreign_keys:
-            self._save_model(primary_name, FOREIGN_KEYS, json.dumps(foreign_keys))
-        if indexes:
-            self._save_model(primary_name, INDEXES_KEYS, json.dumps(indexes))
-
-    def save(self):
-        _concrete_fields = self.__dict__
-        primary_key = _concrete_fields.get(self.primary_key).value
+                valid_rows.append((obj, primary_key, primary_name, foreign_values))
+        for obj, _, _, _ in valid_rows:
+            obj._stored = obj._values.copy()
+        if released:
+            conn.unlink_by_names(released)
+        if not valid_rows:
+            return [], failed
+        # 第二批: 按目标 key 分组, 每个 index 只调用一次
+        groups = {}
+        for position, (obj, primary_key, primary_name, foreign_values) in enumerate(valid_rows):
+            for key, foreign_name, value in foreign_values:
+                groups.setdefault((foreign_name, value), []).append((position, FOREIGN_KEYS, key))
+            for value in obj._index_values():
+                groups.setdefault((cls.Meta.hash_name, value), []).append((position, INDEXES_KEYS, value))
+            groups.setdefault(
+                (cls.Meta.hash_name, cls._keys.primary_index), []
+            ).append((position, PRIMARY_POSITION, None))
+        with conn.pipeline() as pipe:
+            for (model_name, value), entries in groups.items():
+                cls._set_big_keys(pipe, model_name, [valid_rows[position][1] for position, _, _ in entries], value)
+        partitions = [{FOREIGN_KEYS: {}, INDEXES_KEYS: {}, PRIMARY_POSITION: None} for _ in valid_rows]
+        for entries, results in zip(groups.values(), pipe.results):
+            for (position, map_name, key), partition in zip(entries, results):
+                if key is None:
+                    partitions[position][map_name] = partition
+                else:
+                    partitions[position][map_name][key] = partition
+        # 第三批: 写入 model 本身, 同一个有序索引或字典序索引的成员合并成一次 ZADD
+        ordered_members = {}
+        with conn.pipeline() as pipe:
+            for (obj, primary_key, primary_name, _), partition in zip(valid_rows, partitions):
+                ordered_scores = obj._ordered_scores(obj._values)
+                for name, score in ordered_scores.items():
+                    ordered_members.setdefault(name, {})[primary_key] = score
+                lex_members = obj._lex_members(obj._values, primary_key)
+                for name, member in lex_members.items():
+                    ordered_members.setdefault(name, {})[member] = 0
+                pipe.set_hash_mapping(primary_name, obj._build_model(
+                    partition[FOREIGN_KEYS], partition[INDEXES_KEYS], partition[PRIMARY_POSITION],
+                    list(ordered_scores), lex_members
+                ))
+            for name, members in ordered_members.items():
+                pipe.add_sorted_members(name, members)
+        return [row[0] for row in valid_rows], failed
+
+    @classmethod
+    def bulk_create(cls, objs, batch_size=DEFAULT_BATCH_SIZE):
+        objs = list(objs)
+        missing = []
+        for obj in objs:
+            primary_field = getattr(obj, cls.primary_key)
+            if not primary_field.value:
+                if not isinstance(primary_field, IntegerField):
+                    raise InvalidInputException(f'primary key {cls.primary_key} is missing')
+                missing.append(primary_field)
+        if missing:
+            last = conn.increase_by_name(cls._keys.incr, len(missing))
+            for primary_key, primary_field in enumerate(missing, last - len(missing) + 1):
+                primary_field.value = primary_key
+        created, failed, seen = [], [], set()
+        for start in range(0, len(objs), batch_size):
+            batch_created, batch_failed = cls._bulk_create_batch(objs[start:start + batch_size], seen)
+            created.extend(batch_created)
+            failed.extend(batch_failed)
+        return created, failed
+
+    def _get_stored(self, primary_name):
+        return conn.get_hash_by_name_and_keys(primary_name, STORED_KEYS)
+
+    def _deferred_name(self):
+        return self._keys.primary(getattr(self, self.primary_key).value)
+
+    def _set_deferred(self, stored):
+        # 没读取的字段仍是默认值, 索引与唯一键必须按 redis 中的值计算, 只保留读取后修改过的值
+        loaded = self._load_values(dict(zip(self._deferred, stored)))
+        for key in self._deferred:
+            if self._values[key] == self._stored[key]:
+                self._values[key] = loaded[key]
+            self._stored[key] = loaded[key]
+        self._deferred = []
+
+    def _load_deferred(self):
+        if self._deferred:
+            self._set_deferred(conn.get_hash_by_name_and_keys(self._deferred_name(), self._deferred))
+
+    async def _aload_deferred(self):
+        if self._deferred:
+            self._set_deferred(await aconn.get_hash_by_name_and_keys(self._deferred_name(), self._deferred))
+
+    def _changed_fields(self, update_fields):
+        # 返回需要写入的字段, None 表示删除后整体重建
+        _concrete_fields = getattr(self, CONCRETE_FIELDS)
+        if update_fields is None:
+            if self._stored is None:
+                return None
+            fields = [key for key, value in self._values.items() if self._stored.get(key) != value]
+        else:
+            fields = list(update_fields)
+            for key in fields:
+                if key not in _concrete_fields:
+                    raise InvalidInputException(f'{key} is not a field of {self.__class__.__name__}')
+        # 主键与外键改变时仍然整体重建
+        if any(_concrete_fields[key].primary or isinstance(_concrete_fields[key], ForeignField) for key in fields):
+            return None
+        if fields:
+            fields.extend(
+                key for key in self._datetime_fields if _concrete_fields[key].auto_now and key not in fields
+            )
+        return fields
+
+    def _update_plan(self, fields):
+        # 只有包含修改字段的索引需要移动, 新旧索引值都由 redis 中这些索引所有字段的值计算
+        changed = set(fields)
+        indexes = [
+            key_value_pair for key_value_pair, index in zip(self._index_key_value_pairs, getattr(self, INDEXES_KEYS))
+            if changed.intersection(index)
+        ]
+        uniques = [
+            (key_value_pair, unique) for key_value_pair, unique in zip(
+                self._unique_key_value_pairs, getattr(self, UNIQUE_KEYS)
+            ) if changed.intersection(unique)
+        ]
+        ordered_fields = [[*prefix, field] for prefix, field in self._ordered_indexes]
+        ordered = any(changed.intersection(index) for index in ordered_fields)
+        lex = any(changed.intersection(index) for index in self._lex_indexes)
+        # 有序索引与字典序索引按所有索引重新计算, 移动时需要全部字段
+        touched = [
+            index for index in getattr(self, INDEXES_KEYS) + getattr(self, UNIQUE_KEYS) if changed.intersection(index)
+        ]
+        touched += (ordered_fields if ordered else []) + (self._lex_indexes if lex else [])
+        old_fields = sorted({key for index in touched for key in index})
+        return indexes, uniques, old_fields, ordered, lex
+
+    def _update_values(self, fields, old_fields, stored):
+        # 实例上没有修改的字段可能已被其他对象改写, 新值为 redis 中的值加上本次写入的字段
+        _concrete_fields = getattr(self, CONCRETE_FIELDS)
+        old_values = dict(self._values)
+        for key, value in zip(old_fields, stored):
+            old_values[key] = self._default_values[key] if value is None else _concrete_fields[key].load(value)
+        return old_values, {**old_values, **{key: self._values[key] for key in fields}}
+
+    def _unique_moves(self, uniques, old_values, new_values):
+        moves = []
+        for key_value_pair, unique in uniques:
+            old_name = self._keys.unique(key_value_pair(old_values))
+            new_name = self._keys.unique(key_value_pair(new_values))
+            if old_name != new_name:
+                moves.append((unique, old_name, new_name))
+        return moves
+
+    @staticmethod
+    def _reserved_uniques(unique_moves, results):
+        reserved = [new_name for (_, _, new_name), result in zip(unique_moves, results) if result]
+        failed = next((unique for (unique, _, _), result in zip(unique_moves, results) if not result), None)
+        return reserved, failed
+
+    def _queue_update(self, pipe, primary_key, primary_name, fields, plan, stored, values, unique_moves):
+        # 新的索引成员先写入, 结果位于 pipeline 的最前面, 用来更新 hash 中记录的分区
+        indexes, _, _, ordered, lex = plan
+        old_values, new_values = values
+        stored_indexes, stored_ordered, stored_lex = [json.loads(value) if value else None for value in stored]
+        stored_indexes, stored_lex = stored_indexes or {}, stored_lex or {}
+        moved = []
+        for key_value_pair in indexes:
+            old_value, new_value = key_value_pair(old_values), key_value_pair(new_values)
+            if old_value != new_value:
+                moved.append((old_value, new_value))
+                self._set_big_keys(pipe, self.Meta.hash_name, [primary_key], new_value)
+        for old_value, _ in moved:
+            if old_value in stored_indexes:
+                self._delete_big_keys(pipe, self.Meta.hash_name, primary_key, old_value, stored_indexes[old_value])
+        _concrete_fields = getattr(self, CONCRETE_FIELDS)
+        mapping = {key: _concrete_fields[key].dump(self._values[key]) for key in fields}
+        deleted = [key for key, value in mapping.items() if value is None]
+        mapping = {key: value for key, value in mapping.items() if value is not None}
+        if ordered:
+            ordered_scores = self._ordered_scores(new_values)
+            self._delete_ordered_indexes(
+                pipe, primary_key, [name for name in stored_ordered or [] if name not in ordered_scores]
+            )
+            self._save_ordered_indexes(pipe, primary_key, ordered_scores)
+            mapping[ORDERED_INDEXES] = json.dumps(list(ordered_scores))
+        if lex:
+            lex_members = self._lex_members(new_values, primary_key)
+            self._delete_lex_indexes(
+                pipe, {name: member for name, member in stored_lex.items() if lex_members.get(name) != member}
+            )
+            self._save_lex_indexes(
+                pipe, {name: member for name, member in lex_members.items() if stored_lex.get(name) != member}
+            )
+            mapping[LEX_INDEXES] = json.dumps(lex_members)
+        if mapping:
+            pipe.set_hash_mapping(primary_name, mapping)
+        for key in deleted:
+            pipe.delete_hash_by_name_and_key(primary_name, key)
+        if unique_moves:
+            pipe.unlink_by_names([old_name for _, old_name, _ in unique_moves])
+        self._queue_invalidate(pipe, primary_key)
+        return moved, stored_indexes
+
+    @staticmethod
+    def _moved_indexes(moved, stored_indexes, results):
+        old_values = {old_value for old_value, _ in moved}
+        indexes = {key: value for key, value in stored_indexes.items() if key not in old_values}
+        for (_, new_value), partitions in zip(moved, results):
+            indexes[new_value] = partitions[0]
+        return json.dumps(indexes)
+
+    def _update(self, primary_key, primary_name, fields):
+        # 只写入修改过的字段, 只移动包含这些字段的索引与唯一键
+        plan = self._update_plan(fields)
+        old_fields = plan[2]
+        stored = conn.get_hash_by_name_and_keys(primary_name, UPDATE_KEYS + old_fields)
+        if stored[len(UPDATE_KEYS) - 1] is None:
+            return self._create_new(primary_key, primary_name)
+        values = self._update_values(fields, old_fields, stored[len(UPDATE_KEYS):])
+        unique_moves = self._unique_moves(plan[1], *values)
+        if unique_moves:
+            with conn.pipeline() as pipe:
+                for _, _, new_name in unique_moves:
+                    pipe.set_value_if_name_not_exists(new_name, primary_key)
+            reserved, failed = self._reserved_uniques(unique_moves, pipe.results)
+            if failed:
+                if reserved:
+                    conn.unlink_by_names(reserved)
+                raise DuplicatedValueError(failed)
+        with conn.pipeline() as pipe:
+            moved, stored_indexes = self._queue_update(
+                pipe, primary_key, primary_name, fields, plan, stored[:3], values, unique_moves
+            )
+        if moved:
+            conn.set_hash(primary_name, INDEXES_KEYS, self._moved_indexes(moved, stored_indexes, pipe.results))
+        self._invalidate_cache(primary_key)
+
+    async def _aupdate(self, primary_key, primary_name, fields):
+        plan = self._update_plan(fields)
+        old_fields = plan[2]
+        stored = await aconn.get_hash_by_name_and_keys(primary_name, UPDATE_KEYS + old_fields)
+        if stored[len(UPDATE_KEYS) - 1] is None:
+            return await self._acreate_new(primary_key, primary_name)
+        values = self._update_values(fields, old_fields, stored[len(UPDATE_KEYS):])
+        unique_moves = self._unique_moves(plan[1], *values)
+        if unique_moves:
+            async with aconn.pipeline() as pipe:
+                for _, _, new_name in unique_moves:
+                    pipe.set_value_if_name_not_exists(new_name, primary_key)
+            reserved, failed = self._reserved_uniques(unique_moves, pipe.results)
+            if failed:
+                if reserved:
+                    await aconn.unlink_by_names(reserved)
+                raise DuplicatedValueError(failed)
+        async with aconn.pipeline() as pipe:
+            moved, stored_indexes = self._queue_update(
+                pipe, primary_key, primary_name, fields, plan, stored[:3], values, unique_moves
+            )
+        if moved:
+            await aconn.set_hash(primary_name, INDEXES_KEYS, self._moved_indexes(moved, stored_indexes, pipe.results))
+        self._invalidate_cache(primary_key)
+
+    @classmethod
+    def _counter_names(cls, field, values=None, stored=None):
+        # 以计数字段为排序字段的有序索引, 依次按 hash 中记录的列表, 已知的字段值, 或只取没有前缀字段的索引
+        if field not in cls._counters:
+            raise InvalidInputException(f'{field} is not a CounterField of {cls.__name__}')
+        suffix = cls._counters[field]
+        if not suffix:
+            return []
+        if stored is not None:
+            names = json.loads(stored) if stored else []
+        elif values is not None:
+            names = list(cls._ordered_scores(values))
+        else:
+            names = [cls._keys.ordered(ordered_value(None, key)) for prefix, key in cls._ordered_indexes if not prefix]
+        return [name for name in names if name.endswith(suffix)]
+
+    @classmethod
+    def _counter_args(cls, primary_key, field, amount, sorted_names):
+        suffix = cls._counters[field]
+        return (
+            cls._keys.primary(primary_key), field, int(amount), PRIMARY_POSITION, sorted_names,
+            ORDERED_INDEXES if suffix else '', suffix, primary_key
+        )
+
+    @classmethod
+    def _counter_value(cls, primary_key, result):
+        cls._invalidate_cache(primary_key)
+        if result is None:
+            raise ObjectNotFoundException(cls._keys.primary(primary_key))
+        return int(result)
+
+    @classmethod
+    def _incr(cls, primary_key, field, amount, sorted_names):
+        # 有序索引的名字与 hash 中记录的不一致时脚本不写入, 返回记录的列表, 按它重试
+        while True:
+            with conn.pipeline() as pipe:
+                pipe.increase_hash_counter(*cls._counter_args(primary_key, field, amount, sorted_names))
+                cls._queue_invalidate(pipe, primary_key)
+            if not isinstance(pipe.results[0], str):
+                return cls._counter_value(primary_key, pipe.results[0])
+            sorted_names = cls._counter_names(field, stored=pipe.results[0])
+
+    @classmethod
+    async def _aincr(cls, primary_key, field, amount, sorted_names):
+        while True:
+            async with aconn.pipeline() as pipe:
+                pipe.increase_hash_counter(*cls._counter_args(primary_key, field, amount, sorted_names))
+                cls._queue_invalidate(pipe, primary_key)
+            if not isinstance(pipe.results[0], str):
+                return cls._counter_value(primary_key, pipe.results[0])
+            sorted_names = cls._counter_names(field, stored=pipe.results[0])
+
+    def _stored_counter_names(self, field):
+        return self._counter_names(field, self._stored if self._stored is not None else self._values)
+
+    def _set_counter(self, field, value):
+        # 同时更新快照, 之后的 save 不会用旧值覆盖其他进程的增量
+        self._values[field] = value
+        if self._stored is not None:
+            self._stored[field] = value
+        return value
+
+    @hybridmethod
+    def incr(self, field, amount=1):
+        return self._set_counter(field, self._incr(
+            getattr(self, self.primary_key).value, field, amount, self._stored_counter_names(field)
+        ))
+
+    @incr.classmethod
+    def incr(cls, primary_key, field, amount=1):
+        # 一次 HINCRBY 原子地增加计数, 不改写其他字段, 对象不存在时不会创建 hash
+        # 类上调用时不知道前缀字段的值, 有前缀的有序索引要多一次 round trip 读取记录的名字
+        return cls._incr(primary_key, field, amount, cls._counter_names(field))
+
+    @hybridmethod
+    async def aincr(self, field, amount=1):
+        return self._set_counter(field, await self._aincr(
+            getattr(self, self.primary_key).value, field, amount, self._stored_counter_names(field)
+        ))
+
+    @aincr.classmethod
+    async def aincr(cls, primary_key, field, amount=1):
+        return await cls._aincr(primary_key, field, amount, cls._counter_names(field))
+
+    def update(self, **fields):
+        for key, value in fields.items():
+            if key not in getattr(self, CONCRETE_FIELDS):
+                raise InvalidInputException(f'{key} is not a field of {self.__class__.__name__}')
+            setattr(self, key, value)
+        return self.save(update_fields=list(fields))
+
+    async def aupdate(self, **fields):
+        for key, value in fields.items():
+            if key not in getattr(self, CONCRETE_FIELDS):
+                raise InvalidInputException(f'{key} is not a field of {self.__class__.__name__}')
+            setattr(self, key, value)
+        return await self.asave(update_fields=list(fields))
+
+    def save(self, update_fields=None):
+        # 读取或保存过的对象只写入修改过的字段, 没有修改时不访问 redis
+        self._load_deferred()
+        primary_field = getattr(self, self.primary_key)
+        primary_key = primary_field.value
+        fields = self._changed_fields(update_fields) if primary_key else None
+        if fields is not None:
+            if fields:
+                self._deal_fields()
+                self._update(primary_key, self._keys.primary(primary_key), fields)
+            self._stored = self._values.copy()
+            return primary_key
         if not primary_key:
-            if isinstance(_concrete_fields.get(self.primary_key), IntegerField):
-                primary_key = _concrete_fields.get(self.primary_key).value = self._generate_primary_key()
+            if isinstance(primary_field, IntegerField):
+                primary_key = primary_field.value = self._generate_primary_key()
             else:
                 raise InvalidInputException(f'primary key {self.primary_key} is missing')
-        primary_name = REDIS_PRIMARY_KEY_PATTERN.format(hash=self.Meta.hash_name, primary=primary_key)
-        if conn.check_hash_by_name_and_key(primary_name, self.primary_key):
-            self.delete()
-        self._create_new(primary_key, primary_name, _concrete_fields)
+        primary_name = self._keys.primary(primary_key)
+        stored = self._get_stored(primary_name)
+        if stored[-1] is None:
+            stored = None
+        self._create_new(primary_key, primary_name, stored)
+        self._stored = self._values.copy()
+        return primary_key
+
+    async def asave(self, update_fields=None):
+        await self._aload_deferred()
+        primary_field = getattr(self, self.primary_key)
+        primary_key = primary_field.value
+        fields = self._changed_fields(update_fields) if primary_key else None
+        if fields is not None:
+            if fields:
+                self._deal_fields()
+                await self._aupdate(primary_key, self._keys.primary(primary_key), fields)
+            self._stored = self._values.copy()
+            return primary_key
+        if not primary_key:
+            if isinstance(primary_field, IntegerField):
+                primary_key = primary_field.value = await aconn.increase_by_name(
+                    self._keys.incr
+                )
+            else:
+                raise InvalidInputException(f'primary key {self.primary_key} is missing')
+        primary_name = self._keys.primary(primary_key)
+        stored = await aconn.get_hash_by_name_and_keys(primary_name, STORED_KEYS)
+        if stored[-1] is None:
+            stored = None
+        await self._acreate_new(primary_key, primary_name, stored)
+        self._stored = self._values.copy()
         return primary_key
 
     def delete(self):
-        _concrete_fields = self.__dict__
-        primary_key = _concrete_fields.get(self.primary_key).value
-        primary_name = REDIS_PRIMARY_KEY_PATTERN.format(hash=self.Meta.hash_name, primary=primary_key)
-        self._delete_foreign_keys(
-            primary_name, primary_key, conn.get_hash_by_name_and_key(primary_name, FOREIGN_KEYS)
-        )
-        self._delete_indexes(
-            primary_key, conn.get_hash_by_name_and_key(primary_name, INDEXES_KEYS)
-        )
-        self._delete_primary(primary_key, conn.get_hash_by_name_and_key(primary_name, PRIMARY_POSITION))
-        conn.delete_by_name(primary_name)
+        self._load_deferred()
+        primary_key = getattr(self, self.primary_key).value
+        primary_name = self._keys.primary(primary_key)
+        stored = self._get_stored(primary_name)
+        if stored[-1] is None:
+            return
+        with conn.pipeline(transaction=True) as pipe:
+            self._delete_stored(pipe, primary_key, primary_name, stored)
+            self._queue_invalidate(pipe, primary_key, deleted=True)
+        self._invalidate_cache(primary_key)
+        self._stored = None
+
+    async def adelete(self):
+        await self._aload_deferred()
+        primary_key = getattr(self, self.primary_key).value
+        primary_name = self._keys.primary(primary_key)
+        stored = await aconn.get_hash_by_name_and_keys(primary_name, STORED_KEYS)
+        if stored[-1] is None:
+            return
+        async with aconn.pipeline(transaction=True) as pipe:
+            self._delete_stored(pipe, primary_key, primary_name, stored)
+            self._queue_invalidate(pipe, primary_key, deleted=True)
+        self._invalidate_cache(primary_key)
+        self._stored = None
 
     @classmethod
     def find_indexes(cls, indexes):
@@ -332,79 +1045,417 @@ class BaseModel(object, metaclass=ModelMeta):
         return index_tree.search(indexes)
 
     @classmethod
-    def find_all_keys(cls, keys, path, arrangement):
-        if not keys:
-            arrangement.append(path)
-            return
-        for index, element in enumerate(keys):
-            cls.find_all_keys(keys[:index]+keys[index+1:], path+[element], arrangement)
-        return
+    def _index_candidates(cls, params):
+        # 同一组查询字段的候选索引按 model 缓存, 能用唯一索引时不再比较代价
+        keys = frozenset(params)
+        candidates = cls._index_plans.get(keys)
+        if candidates is None:
+            index_tree: Trie = getattr(cls, INDEX_TREE)
+            candidates = index_tree.paths(keys)
+            unique = next((index for index in candidates if index in getattr(cls, UNIQUE_KEYS)), None)
+            candidates = cls._index_plans[keys] = [unique] if unique else candidates
+        return candidates
 
     @classmethod
-    def get_indexes(cls, params):
-        keys = [key for key, _ in params.items()]
-        all_keys = []
-        cls.find_all_keys(keys, [], all_keys)
-        indexes = []
-        for key in all_keys:
-            tmp = cls.find_indexes(key)
-            if len(tmp) > len(indexes):
-                indexes = tmp
+    def _count_names(cls, candidates, params):
+        return [cls._keys.index_count(cls._params_key_value_pair(index, params)) for index in candidates]
+
+    @classmethod
+    def _choose_indexes(cls, candidates, counts):
+        # 行数最少的索引代价最低, 行数相同时选更长的索引以减少剩余的过滤条件
+        # 其余索引按行数从少到多加入, 只要能覆盖新的查询字段, 就在 redis 端求交集
+        if not counts:
+            return candidates[:1]
+        ordered = sorted(zip(candidates, counts), key=lambda item: (int(item[1] or 0), -len(item[0])))
+        if not int(ordered[0][1] or 0):
+            return [ordered[0][0]]
+        indexes, covered = [], set()
+        for index, _ in ordered:
+            if not covered.issuperset(index):
+                indexes.append(index)
+                covered.update(index)
         return indexes
 
     @classmethod
-    def initialize_object(cls, value):
-        new_object = cls(**value)
-        _concrete_fields = new_object.__dict__
+    def get_index_plan(cls, params):
+        candidates = cls._index_candidates(params)
+        counts = conn.get_by_names(cls._count_names(candidates, params)) if len(candidates) > 1 else []
+        return cls._choose_indexes(candidates, counts)
+
+    @classmethod
+    async def aget_index_plan(cls, params):
+        candidates = cls._index_candidates(params)
+        counts = await aconn.get_by_names(cls._count_names(candidates, params)) if len(candidates) > 1 else []
+        return cls._choose_indexes(candidates, counts)
+
+    @classmethod
+    def get_indexes(cls, params):
+        return list(next(iter(cls.get_index_plan(params)), []))
+
+    @classmethod
+    def _ordered_plan(cls, params, field):
+        # 前缀字段都在查询条件中的有序索引里, 选前缀最长的, 其余条件在 redis 端过滤
+        prefixes = [
+            prefix for prefix, ordered_field in cls._ordered_indexes
+            if ordered_field == field and set(prefix).issubset(params)
+        ]
+        if not prefixes:
+            raise InvalidInputException(f'no ordered index on {field} for {sorted(params)}')
+        return max(prefixes, key=len)
+
+    @classmethod
+    def _ordered_name(cls, prefix, field, params):
+        return cls._keys.ordered(ordered_value(prefix and cls._params_key_value_pair(prefix, params), field))
+
+    @classmethod
+    def _read_pages(cls, pages):
+        while not pages.done:
+            yield from pages.feed(getattr(conn, pages.command)(*pages.args()))
+
+    @classmethod
+    async def _aread_pages(cls, pages):
+        while not pages.done:
+            for row in pages.feed(await getattr(aconn, pages.command)(*pages.args())):
+                yield row
+
+    @classmethod
+    def _score_plan(cls, params, field, lower, upper):
+        # 返回 (读取函数, 计数命令, 剩余条件), 读取函数按 (desc, after, chunk_size) 返回 ScorePages
+        # 计数命令为 (客户端方法名, 参数), 由 QuerySet 用同步或异步的客户端执行
+        prefix = cls._ordered_plan(params, field)
+        name = cls._ordered_name(prefix, field, params)
+        residual = {key: value for key, value in params.items() if key not in prefix}
+
+        def read(desc, after, chunk_size):
+            return ScorePages(name, desc, after, chunk_size, lower, upper)
+        count = ('count_sorted_by_score', (name, score_arg(lower, '-inf'), score_arg(upper, '+inf')))
+        return read, count, residual
+
+    @classmethod
+    def _lex_plan(cls, params, field, lower, upper):
+        # 排在 field 之前的字段等值匹配, 组成成员的公共前缀; field 之后的等值条件直接用成员中的值判断
+        index, position = next((
+            (index, index.index(field)) for index in cls._lex_indexes
+            if field in index and set(index[:index.index(field)]).issubset(params)
+        ), (None, None))
+        if index is None:
+            raise InvalidInputException(f'no lex index on {field} for {sorted(params)}')
+        prepared = {
+            key: '' if value is None else str(value)
+            for key, value in cls._prepare_params({key: params[key] for key in index if key in params}).items()
+        }
+        prefix = ''.join(f'{prepared[key]}{LEX_SEPARATOR}' for key in index[:position])
+        matches = [(i, prepared[key]) for i, key in enumerate(index) if i >= position and key in prepared]
+        residual = {key: value for key, value in params.items() if key not in index}
+        name = cls._keys.lex('-'.join(index))
+
+        def read(desc, after, chunk_size):
+            minimum, maximum = lower, upper
+            if after:
+                cursor = (after[0][len(prefix):], True)
+                minimum, maximum = (minimum, tighter(maximum, cursor, False)) if desc else (
+                    tighter(minimum, cursor, True), maximum
+                )
+            return LexPages(
+                name, lex_arg(minimum, prefix, True), lex_arg(maximum, prefix, False), desc, chunk_size, matches
+            )
+        count = ('count_sorted_by_lex', (name, lex_arg(lower, prefix, True), lex_arg(upper, prefix, False)))
+        return read, None if matches else count, residual
+
+    @classmethod
+    def _exact_count_name(cls, params):
+        # 没有查询条件时使用 primary 索引的计数器
+        if not params:
+            return cls._keys.index_count(cls._keys.primary_index)
+        index_tree: Trie = getattr(cls, INDEX_TREE)
+        keys = frozenset(params)
+        for index in index_tree.paths(keys):
+            if len(index) == len(keys):
+                return cls._keys.index_count(cls._params_key_value_pair(index, params))
+        return None
+
+    @classmethod
+    def _get_counter(cls, name):
+        return conn.get_by_name(name) or 0
+
+    @classmethod
+    async def _aget_counter(cls, name):
+        return await aconn.get_by_name(name) or 0
+
+    @classmethod
+    def _count_sorted(cls, count):
+        command, args = count
+        return getattr(conn, command)(*args)
+
+    @classmethod
+    async def _acount_sorted(cls, count):
+        command, args = count
+        return await getattr(aconn, command)(*args)
+
+    @classmethod
+    def count(cls, **params):
+        return QuerySet(cls).filter(**params).count()
+
+    @classmethod
+    def exists(cls, **params):
+        return QuerySet(cls).filter(**params).exists()
+
+    @classmethod
+    def explain(cls, **params):
+        index_tree: Trie = getattr(cls, INDEX_TREE)
+        paths = index_tree.paths(frozenset(params))
+        key_value_pairs = [cls._params_key_value_pair(index, params) for index in paths] + [cls._keys.primary_index]
+        values = conn.get_by_names(
+            [cls._keys.index_count(key_value_pair) for key_value_pair in key_value_pairs]
+            + [cls._keys.index_partition(key_value_pair) for key_value_pair in key_value_pairs]
+        )
+        stats = {
+            tuple(index): (int(count or 0), int(partition or 0))
+            for index, count, partition in zip(paths + [[]], values, values[len(key_value_pairs):])
+        }
+        candidates = cls._index_candidates(params)
+        indexes = cls._choose_indexes(candidates, [stats[tuple(candidate)][0] for candidate in candidates])
+        index = indexes[0] if indexes else []
+        unique = index in getattr(cls, UNIQUE_KEYS)
+        scanned_rows, partition = stats[tuple(index)]
+        estimated_rows = min([scanned_rows] + [stats[tuple(other)][0] for other in indexes[1:]])
+        if unique:
+            estimated_rows, lookup = min(estimated_rows, 1), 1
+        else:
+            # 求交集时 HSCAN 读到的每批成员再用一个 pipeline 与其他索引比较
+            scan_rounds = -(-min(scanned_rows, BIG_KEY_LIMIT) // DEFAULT_SCAN_COUNT)
+            lookup = 1 + -(-partition // SCAN_PARTITIONS) * scan_rounds * (2 if len(indexes) > 1 else 1)
+        covered = {key for other in indexes for key in other}
+        residual = [key for key in params if key not in covered]
+        batches = -(-estimated_rows // DEFAULT_BATCH_SIZE)
+        return {
+            'index': list(index),
+            'indexes': [list(other) for other in indexes],
+            'unique': unique,
+            'estimated_rows': estimated_rows,
+            'residual': residual,
+            'candidates': [{'index': list(path), 'rows': stats[tuple(path)][0]} for path in paths],
+            'round_trips': int(len(candidates) > 1) + lookup + batches * (2 if residual else 1),
+        }
+
+    @classmethod
+    def initialize_object(cls, value, fields=None):
+        new_object = cls.__new__(cls)
+        new_object._values = cls._load_values(value)
+        new_object._stored = new_object._values.copy()
+        new_object._deferred = [key for key in getattr(cls, CONCRETE_FIELDS) if key not in fields] if fields else []
         return new_object
 
+    @classmethod
+    def _prepare_params(cls, params):
+        _concrete_fields = getattr(cls, CONCRETE_FIELDS)
+        prepared = {}
+        for key, value in params.items():
+            if key not in _concrete_fields:
+                raise InvalidInputException(f'{key} is not a field of {cls.__name__}')
+            prepared[key] = _concrete_fields[key].prepare(value)
+        return prepared
+
+    @classmethod
+    def _conditions(cls, residual, excludes=()):
+        conditions = [(True, cls._prepare_params(residual))] if residual else []
+        return conditions + [(False, cls._prepare_params(exclude)) for exclude in excludes]
+
+    @classmethod
+    def _match_primary_keys(cls, primary_keys, conditions):
+        # 剩余条件在 redis 端用 HMGET 比较, 只取回命中对象的完整 hash
+        if not conditions or not primary_keys:
+            return primary_keys
+        names = conn.filter_hash_names([cls._keys.primary(primary_key) for primary_key in primary_keys], conditions)
+        return [name[len(cls.Meta.hash_name) + 1:] for name in names]
+
+    @classmethod
+    async def _amatch_primary_keys(cls, primary_keys, conditions):
+        if not conditions or not primary_keys:
+            return primary_keys
+        names = await aconn.filter_hash_names(
+            [cls._keys.primary(primary_key) for primary_key in primary_keys], conditions
+        )
+        return [name[len(cls.Meta.hash_name) + 1:] for name in names]
+
     @classmethod
     def filter(cls, **params):
-        keys = [key for key, _ in params.items()]
-        arrangement = []
-        cls.find_all_keys(keys, [], arrangement)
-        indexes = cls.get_indexes(params)
-        primary_keys = cls._get_index(indexes, params)
-        for index in indexes:
-            del params[index]
-        if not primary_keys:
-            raise ObjectNotFoundException(primary_keys)
-        values = []
-        for primary_key in primary_keys:
-            primary_name = REDIS_PRIMARY_KEY_PATTERN.format(hash=cls.Meta.hash_name, primary=primary_key)
-            values.append(conn.get_all_hash_by_name(primary_name))
-        result = []
+        return QuerySet(cls).filter(**params)
+
+    @classmethod
+    async def afilter(cls, **params):
+        return [obj async for obj in QuerySet(cls).filter(**params).aiterator()]
+
+    @classmethod
+    async def acount(cls, **params):
+        return await QuerySet(cls).filter(**params).acount()
+
+    @classmethod
+    async def aexists(cls, **params):
+        return await QuerySet(cls).filter(**params).aexists()
+
+    @classmethod
+    def _collect_objects(cls, values, result):
         for value in values:
-            for k, v in params.items():
-                if value[k] != v:
-                    break
-            result.append(value)
-        return [cls.initialize_object(value) for value in result]
+            if value:
+                new_object = cls.initialize_object(value)
+                result[getattr(new_object, cls.primary_key).value] = new_object
+        return result
 
     @classmethod
-    def get(cls, **params):
-        if DEFAULT_PRIMARY_KEY in params.keys():
-            primary_name = REDIS_PRIMARY_KEY_PATTERN.format(hash=cls.Meta.hash_name,
-                                                            primary=params.get(DEFAULT_PRIMARY_KEY))
+    def in_bulk(cls, primary_keys, chunk_size=DEFAULT_BATCH_SIZE):
+        primary_keys = list(primary_keys)
+        result = {}
+        for start in range(0, len(primary_keys), chunk_size):
+            with conn.pipeline() as pipe:
+                for primary_key in primary_keys[start:start + chunk_size]:
+                    pipe.get_all_hash_by_name(cls._keys.primary(primary_key))
+            cls._collect_objects(pipe.results, result)
+        return result
+
+    @classmethod
+    def _fetch_fields(cls, primary_keys, fields, chunk_size=DEFAULT_BATCH_SIZE):
+        # 只用 HMGET 读取需要的字段, primary_position 用来判断对象是否还存在
+        names = [PRIMARY_POSITION, *fields]
+        rows = []
+        for start in range(0, len(primary_keys), chunk_size):
+            with conn.pipeline() as pipe:
+                for primary_key in primary_keys[start:start + chunk_size]:
+                    pipe.get_hash_by_name_and_keys(cls._keys.primary(primary_key), names)
+            rows.extend(values[1:] for values in pipe.results if values[0] is not None)
+        return rows
+
+    @classmethod
+    async def _afetch_fields(cls, primary_keys, fields, chunk_size=DEFAULT_BATCH_SIZE):
+        names = [PRIMARY_POSITION, *fields]
+        rows = []
+        for start in range(0, len(primary_keys), chunk_size):
+            async with aconn.pipeline() as pipe:
+                for primary_key in primary_keys[start:start + chunk_size]:
+                    pipe.get_hash_by_name_and_keys(cls._keys.primary(primary_key), names)
+            rows.extend(values[1:] for values in pipe.results if values[0] is not None)
+        return rows
+
+    @classmethod
+    async def _ain_bulk_chunk(cls, primary_keys):
+        async with aconn.pipeline() as pipe:
+            for primary_key in primary_keys:
+                pipe.get_all_hash_by_name(cls._keys.primary(primary_key))
+        return pipe.results
+
+    @classmethod
+    async def ain_bulk(cls, primary_keys, chunk_size=DEFAULT_BATCH_SIZE):
+        primary_keys = list(primary_keys)
+        chunks = await asyncio.gather(*[
+            cls._ain_bulk_chunk(primary_keys[start:start + chunk_size])
+            for start in range(0, len(primary_keys), chunk_size)
+        ])
+        result = {}
+        for values in chunks:
+            cls._collect_objects(values, result)
+        return result
+
+    @classmethod
+    def _get_cached(cls, primary_key, primary_name):
+        cache: ModelCache = cls._cache
+        if cache.invalidation == CACHE_PUBSUB and not cache.subscribed:
+            conn.subscribe(cls._keys.channel, cache.invalidate)
+            cache.subscribed = True
+        version = None
+        if cache.invalidation == CACHE_VERSION:
+            version = conn.get_by_name(cls._keys.version(primary_key))
+        value = cache.get(str(primary_key), version)
+        if value is None:
+            generation = cache.generation
             value = conn.get_all_hash_by_name(primary_name)
+            if value:
+                cache.set(str(primary_key), value, version, generation)
+        return value
+
+    @classmethod
+    async def _aget_cached(cls, primary_key, primary_name):
+        cache: ModelCache = cls._cache
+        if cache.invalidation == CACHE_PUBSUB and not cache.subscribed:
+            conn.subscribe(cls._keys.channel, cache.invalidate)
+            cache.subscribed = True
+        version = None
+        if cache.invalidation == CACHE_VERSION:
+            version = await aconn.get_by_name(
+                cls._keys.version(primary_key)
+            )
+        value = cache.get(str(primary_key), version)
+        if value is None:
+            generation = cache.generation
+            value = await aconn.get_all_hash_by_name(primary_name)
+            if value:
+                cache.set(str(primary_key), value, version, generation)
+        return value
+
+    @classmethod
+    def cache_info(cls):
+        return cls._cache.info() if cls._cache is not None else None
+
+    @classmethod
+    def _match_value(cls, value, params):
+        # 与 hash_filter 相同, 按存入 redis 的字符串比较, 缺失字段等于 ''
+        prepared = cls._prepare_params(params)
+        return all(value.get(key, '') == ('' if item is None else str(item)) for key, item in prepared.items())
+
+    @classmethod
+    def get(cls, **params):
+        primary_key = cls.primary_key
+        if primary_key in params:
+            key = cls._prepare_params({primary_key: params[primary_key]})[primary_key]
+            primary_name = cls._keys.primary(key)
+            if cls._cache is not None:
+                value = cls._get_cached(key, primary_name)
+            else:
+                value = conn.get_all_hash_by_name(primary_name)
+            if not value or not cls._match_value(value, params):
+                raise ObjectNotFoundException(primary_name)
+        else:
+            # 与 QuerySet 使用同一个查询计划与剩余条件, 最多读取两个主键即可判断是否唯一
+            chunks = QuerySet(cls).filter(**params)._primary_key_chunks(DEFAULT_BATCH_SIZE)
+            primary_keys = list(islice(chain.from_iterable(chunks), 2))
+            if not primary_keys:
+                raise ObjectNotFoundException(params)
+            elif len(primary_keys) != 1:
+                raise GetMoreObjectsException(params, len(primary_keys))
+            value = conn.get_all_hash_by_name(cls._keys.primary(primary_keys[0]))
             if not value:
+                raise ObjectNotFoundException(primary_keys)
+        return cls.initialize_object(value)
+
+    @classmethod
+    async def aget(cls, **params):
+        primary_key = cls.primary_key
+        if primary_key in params:
+            key = cls._prepare_params({primary_key: params[primary_key]})[primary_key]
+            primary_name = cls._keys.primary(key)
+            if cls._cache is not None:
+                value = await cls._aget_cached(key, primary_name)
+            else:
+                value = await aconn.get_all_hash_by_name(primary_name)
+            if not value or not cls._match_value(value, params):
                 raise ObjectNotFoundException(primary_name)
         else:
-            indexes = cls.get_indexes(params)
-            primary_names = cls._get_index(indexes, params)
-            if not primary_names:
-                raise ObjectNotFoundException(primary_names)
-            elif len(primary_names) != 1:
-                raise GetMoreObjectsException(params, len(primary_names))
-            primary_name = REDIS_PRIMARY_KEY_PATTERN.format(hash=cls.Meta.hash_name,
-                                                            primary=primary_names[0])
-            value = conn.get_all_hash_by_name(primary_name)
+            primary_keys = []
+            async for chunk in QuerySet(cls).filter(**params)._aprimary_key_chunks(DEFAULT_BATCH_SIZE):
+                primary_keys.extend(chunk)
+                if len(primary_keys) > 1:
+                    break
+            primary_keys = primary_keys[:2]
+            if not primary_keys:
+                raise ObjectNotFoundException(params)
+            elif len(primary_keys) != 1:
+                raise GetMoreObjectsException(params, len(primary_keys))
+            value = await aconn.get_all_hash_by_name(cls._keys.primary(primary_keys[0]))
             if not value:
-                raise ObjectNotFoundException(primary_names)
+                raise ObjectNotFoundException(primary_keys)
         return cls.initialize_object(value)
 
     def _generate_primary_key(self):
-        return conn.increase_by_name(REDIS_PRIMARY_DEFAULT_INCR_KEY.format(hash=self.Meta.hash_name))
+        return conn.increase_by_name(self._keys.incr)
 
     class Meta:
         unique_together = []
@@ -0,0 +1,520 @@
+from itertools import islice, chain
+
+from constants.models import DEFAULT_BATCH_SIZE, CONCRETE_FIELDS
+from exception.exceptions import InvalidInputException
+from models.base.codecs import LEX_SEPARATOR
+from models.base.fields import IntegerField, BoolField, DatetimeField, CharField
+
+VALUES = 'values'
+VALUES_LIST = 'values_list'
+FLAT = 'flat'
+LOOKUP_SEPARATOR = '__'
+RANGE_LOOKUPS = ['gt', 'gte', 'lt', 'lte', 'between', 'startswith']
+
+
+def load_numpy():
+    # numpy 是可选依赖, 没有安装时列按 list 返回
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def column_decoder(field, numpy):
+    if numpy is None or not isinstance(field, (IntegerField, BoolField, DatetimeField)):
+        return lambda values: [field.to_python(value) for value in values]
+    default = field.dump(field._value)
+    if isinstance(field, IntegerField):
+        return lambda values: numpy.array(
+            [default if value is None else value for value in values]
+        ).astype(numpy.int64)
+    if isinstance(field, BoolField):
+        return lambda values: numpy.array([default if value is None else value for value in values]) == '1'
+    return lambda values: numpy.array(
+        [(default or 'NaT') if value is None else value for value in values], dtype='datetime64[s]'
+    )
+
+
+def range_bounds(field, lookup, value):
+    # 返回 (下界, 上界), 每个界为 (分数, 是否开区间) 或 None
+    if isinstance(field, CharField):
+        if lookup == 'between':
+            return lex_bounds(lookup, [field.prepare(item) for item in value])
+        return lex_bounds(lookup, field.prepare(value))
+    if lookup == 'startswith':
+        raise InvalidInputException(f'startswith only works on CharField, {field.name} is not')
+    if lookup == 'between':
+        low, high = value
+        return (field.prepare_score(low), False), (field.prepare_score(high), False)
+    score = field.prepare_score(value)
+    if lookup in ('gt', 'gte'):
+        return (score, lookup == 'gt'), None
+    return None, (score, lookup == 'lt')
+
+
+def successor(value):
+    # 比所有以 value 开头的字符串都大的最小字符串, value 为空时没有上界
+    if not value:
+        return None
+    return f'{value[:-1]}{chr(ord(value[-1]) + 1)}'
+
+
+def lex_bounds(lookup, value):
+    # 字典序的界相对于字段的值, 读取时再拼上前缀字段的值
+    # 字段值中不含 \0, 所以 value + '\x01' 比所有等于 value 的成员都大, 比所有大于 value 的值都小
+    if lookup == 'startswith':
+        upper = successor(value)
+        return ((value, False) if value else None), ((upper, True) if upper else None)
+    if lookup == 'between':
+        low, high = value
+        return (low, False), (f'{high}\x01', True)
+    if lookup == 'gt':
+        return (f'{value}\x01', False), None
+    if lookup == 'gte':
+        return (value, False), None
+    if lookup == 'lt':
+        return None, (value, True)
+    return None, (f'{value}\x01', True)
+
+
+def lex_arg(bound, prefix, lower):
+    # 转换成 ZRANGEBYLEX 的参数, 没有界时用前缀本身限定范围
+    if bound is None:
+        if not prefix:
+            return '-' if lower else '+'
+        return f'[{prefix}' if lower else f'({successor(prefix)}'
+    value, exclusive = bound
+    return f'{"(" if exclusive else "["}{prefix}{value}'
+
+
+def tighter(first, second, lower):
+    # 同一端的两个界取更严格的一个, 相同分数时开区间更严格
+    if first is None or second is None:
+        return first or second
+    if lower:
+        return max(first, second)
+    return min(first, second, key=lambda bound: (bound[0], not bound[1]))
+
+
+def score_arg(bound, default):
+    if bound is None:
+        return default
+    score, exclusive = bound
+    return f'({score}' if exclusive else score
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def achunked(iterable, size):
+    chunk = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ScorePages:
+    # 按分数逐页读取 sorted set, 下一页从上一页最后一个分数开始, offset 跳过该分数上已经返回的成员
+    # 同分的成员按 member 的字典序排列, after 游标 (score, primary_key) 之前的同分成员在本地跳过
+    # 只计算每页的参数与结果, 由同步或异步的客户端执行, 见 BaseModel._read_pages
+    command = 'range_sorted_by_score'
+
+    def __init__(self, name, desc, after=None, chunk_size=DEFAULT_BATCH_SIZE, lower=None, upper=None):
+        self.name = name
+        self.desc = desc
+        self.after = after
+        self.chunk_size = chunk_size
+        self.lower = lower
+        self.upper = upper
+        self.score, self.member = after if after else (None, None)
+        self.bound, self.offset = self.score, 0
+        self.done = False
+
+    def args(self):
+        cursor = None if self.bound is None else (self.bound, False)
+        minimum = score_arg(self.lower if self.desc else tighter(self.lower, cursor, True), '-inf')
+        maximum = score_arg(tighter(self.upper, cursor, False) if self.desc else self.upper, '+inf')
+        return self.name, minimum, maximum, self.offset, self.chunk_size, self.desc
+
+    def skipped(self, key, key_score):
+        return self.after and key_score == self.score and (key >= self.member if self.desc else key <= self.member)
+
+    def feed(self, rows):
+        result = [(key, key_score) for key, key_score in rows if not self.skipped(key, key_score)]
+        if len(rows) < self.chunk_size:
+            self.done = True
+            return result
+        last = rows[-1][1]
+        if last == self.bound:
+            self.offset += len(rows)
+        else:
+            self.offset = sum(1 for _, key_score in rows if key_score == last)
+        self.bound = last
+        return result
+
+
+class LexPages:
+    # 成员互不相同, 下一页直接从上一页最后一个成员之后开始, 生成 (primary_key, 成员)
+    command = 'range_sorted_by_lex'
+
+    def __init__(self, name, minimum, maximum, desc, chunk_size=DEFAULT_BATCH_SIZE, matches=()):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.desc = desc
+        self.chunk_size = chunk_size
+        self.matches = matches
+        self.done = False
+
+    def args(self):
+        return self.name, self.minimum, self.maximum, 0, self.chunk_size, self.desc
+
+    def feed(self, members):
+        result = []
+        for member in members:
+            values = member.split(LEX_SEPARATOR)
+            if all(values[i] == value for i, value in self.matches):
+                result.append((values[-1], member))
+        if len(members) < self.chunk_size:
+            self.done = True
+        elif self.desc:
+            self.maximum = f'({members[-1]}'
+        else:
+            self.minimum = f'({members[-1]}'
+        return result
+
+
+class QuerySet:
+    # 惰性查询: 只有迭代, len, bool 或切片时才访问 redis
+    def __init__(
+        self, model, params=None, excludes=None, empty=False, fields=None, mode=None, ordering=None, ranges=None
+    ):
+        self.model = model
+        self.params = params or {}
+        self.excludes = excludes or []
+        self.empty = empty
+        # fields 为 None 时读取整个 hash, 否则只 HMGET 这些字段
+        self.fields = fields
+        self.mode = mode
+        # ordering 为 '-field' 或 'field', 由 Meta.ordered_indexes 中的 sorted set 提供顺序
+        self.ordering = ordering
+        # ranges: 字段 -> (下界, 上界), 由有序索引按分数读取, CharField 由字典序索引读取
+        self.ranges = ranges or {}
+        self._result = None
+
+    def _clone(self, **kwargs):
+        attrs = {
+            'params': self.params, 'excludes': self.excludes, 'empty': self.empty, 'fields': self.fields,
+            'mode': self.mode, 'ordering': self.ordering, 'ranges': self.ranges,
+        }
+        attrs.update(kwargs)
+        return QuerySet(self.model, **attrs)
+
+    def filter(self, **params):
+        merged = dict(self.params)
+        ranges = dict(self.ranges)
+        empty = False
+        for key, value in params.items():
+            if LOOKUP_SEPARATOR in key:
+                field, lookup = self._check_lookup(key)
+                lower, upper = range_bounds(getattr(self.model, CONCRETE_FIELDS)[field], lookup, value)
+                current_lower, current_upper = ranges.get(field, (None, None))
+                ranges[field] = (tighter(current_lower, lower, True), tighter(current_upper, upper, False))
+                continue
+            if key in merged and merged[key] != value:
+                empty = True
+            merged[key] = value
+        return self._clone(params=merged, ranges=ranges, empty=self.empty or empty)
+
+    def _check_lookup(self, key):
+        field, lookup = key.split(LOOKUP_SEPARATOR, 1)
+        if field not in getattr(self.model, CONCRETE_FIELDS):
+            raise InvalidInputException(f'{field} is not a field of {self.model.__name__}')
+        if lookup not in RANGE_LOOKUPS:
+            raise InvalidInputException(f'{lookup} is not a supported lookup, use one of {RANGE_LOOKUPS}')
+        return field, lookup
+
+    def exclude(self, **params):
+        return self._clone(excludes=self.excludes + [params])
+
+    def _check_fields(self, fields):
+        _concrete_fields = getattr(self.model, CONCRETE_FIELDS)
+        for field in fields:
+            if field not in _concrete_fields:
+                raise InvalidInputException(f'{field} is not a field of {self.model.__name__}')
+        return list(fields or _concrete_fields)
+
+    def values(self, *fields):
+        return self._clone(fields=self._check_fields(fields), mode=VALUES)
+
+    def values_list(self, *fields, flat=False):
+        if flat and len(fields) != 1:
+            raise InvalidInputException('values_list(flat=True) needs exactly one field')
+        return self._clone(fields=self._check_fields(fields), mode=FLAT if flat else VALUES_LIST)
+
+    def only(self, *fields):
+        fields = self._check_fields(fields)
+        if self.model.primary_key not in fields:
+            fields.insert(0, self.model.primary_key)
+        return self._clone(fields=fields, mode=None)
+
+    def order_by(self, field):
+        if field.lstrip('-') not in getattr(self.model, CONCRETE_FIELDS):
+            raise InvalidInputException(f'{field} is not a field of {self.model.__name__}')
+        return self._clone(ordering=field)
+
+    def _sorted_plan(self):
+        # 排序与范围查询共用一个有序索引, CharField 使用字典序索引, 其余字段使用按分数排序的索引
+        fields = set(self.ranges)
+        if self.ordering:
+            fields.add(self.ordering.lstrip('-'))
+        if len(fields) > 1:
+            raise InvalidInputException(f'range lookups and order_by() must use the same field, got {sorted(fields)}')
+        field = fields.pop()
+        lower, upper = self.ranges.get(field, (None, None))
+        if isinstance(getattr(self.model, CONCRETE_FIELDS)[field], CharField):
+            return self.model._lex_plan(self.params, field, lower, upper)
+        return self.model._score_plan(self.params, field, lower, upper)
+
+    def _ordered_pages(self, chunk_size, after):
+        read, _, residual = self._sorted_plan()
+        pages = read(bool(self.ordering) and self.ordering.startswith('-'), after, chunk_size)
+        return pages, self.model._conditions(residual, self.excludes)
+
+    def _ordered_chunks(self, chunk_size, after=None):
+        # 每批从 sorted set 读取 chunk_size 个 (primary_key, score), 剩余条件过滤后保持顺序
+        pages, conditions = self._ordered_pages(chunk_size, after)
+        for chunk in chunked(self.model._read_pages(pages), chunk_size):
+            if conditions:
+                matched = set(self.model._match_primary_keys([key for key, _ in chunk], conditions))
+                chunk = [row for row in chunk if row[0] in matched]
+            yield chunk
+
+    async def _aordered_chunks(self, chunk_size, after=None):
+        pages, conditions = self._ordered_pages(chunk_size, after)
+        async for chunk in achunked(self.model._aread_pages(pages), chunk_size):
+            if conditions:
+                matched = set(await self.model._amatch_primary_keys([key for key, _ in chunk], conditions))
+                chunk = [row for row in chunk if row[0] in matched]
+            yield chunk
+
+    def _residual_conditions(self, indexes):
+        covered = {key for index in indexes for key in index}
+        residual = {key: value for key, value in self.params.items() if key not in covered}
+        return self.model._conditions(residual, self.excludes)
+
+    def _primary_key_lookup(self):
+        # 查询条件包含主键时只需检查这一个对象, 其余条件与主键一起在 redis 端比较, 对象不存在时主键也不相等
+        primary_key = self.model.primary_key
+        if self.ranges or primary_key not in self.params:
+            return None
+        prepared = self.model._prepare_params({primary_key: self.params[primary_key]})[primary_key]
+        return [prepared], self.model._conditions(self.params, self.excludes)
+
+    def _primary_key_chunks(self, chunk_size):
+        if self.empty:
+            return
+        lookup = self._primary_key_lookup()
+        if lookup:
+            yield self.model._match_primary_keys(*lookup)
+            return
+        if self.ordering or self.ranges:
+            for chunk in self._ordered_chunks(chunk_size):
+                yield [key for key, _ in chunk]
+            return
+        indexes = self.model.get_index_plan(self.params)
+        conditions = self._residual_conditions(indexes)
+        for primary_keys in chunked(self.model._iter_index(indexes, self.params), chunk_size):
+            yield self.model._match_primary_keys(primary_keys, conditions)
+
+    async def _aprimary_key_chunks(self, chunk_size):
+        # 与 _primary_key_chunks 相同, 由调用方决定何时停止读取
+        if self.empty:
+            return
+        lookup = self._primary_key_lookup()
+        if lookup:
+            yield await self.model._amatch_primary_keys(*lookup)
+            return
+        if self.ordering or self.ranges:
+            async for chunk in self._aordered_chunks(chunk_size):
+                yield [key for key, _ in chunk]
+            return
+        indexes = await self.model.aget_index_plan(self.params)
+        conditions = self._residual_conditions(indexes)
+        async for primary_keys in achunked(self.model._aiter_index(indexes, self.params), chunk_size):
+            yield await self.model._amatch_primary_keys(primary_keys, conditions)
+
+    def iterator(self, chunk_size=DEFAULT_BATCH_SIZE):
+        # 从索引分区中流式读取主键, 按 chunk_size 分批 pipeline 读取对象
+        # 内存占用与结果集大小无关
+        for primary_keys in self._primary_key_chunks(chunk_size):
+            yield from self._load(primary_keys, chunk_size)
+
+    async def aiterator(self, chunk_size=DEFAULT_BATCH_SIZE):
+        async for primary_keys in self._aprimary_key_chunks(chunk_size):
+            for item in await self._aload(primary_keys, chunk_size):
+                yield item
+
+    def _load(self, primary_keys, chunk_size):
+        if self.fields is None:
+            return self.model.in_bulk(primary_keys, chunk_size).values()
+        return self._project(self.model._fetch_fields(primary_keys, self.fields, chunk_size))
+
+    async def _aload(self, primary_keys, chunk_size):
+        if self.fields is None:
+            return (await self.model.ain_bulk(primary_keys, chunk_size)).values()
+        return self._project(await self.model._afetch_fields(primary_keys, self.fields, chunk_size))
+
+    def page(self, size, after=None):
+        # 键集分页: after 为上一页返回的游标 (score 或字典序索引的成员, primary_key), 每页的代价只与 size 有关
+        # 返回 (结果, 下一页的游标), 没有下一页时游标为 None
+        if not self.ordering:
+            raise InvalidInputException('page() needs order_by()')
+        if self.empty:
+            return [], None
+        rows = list(islice(chain.from_iterable(self._ordered_chunks(size, after)), size))
+        cursor = (rows[-1][1], rows[-1][0]) if len(rows) == size else None
+        return list(self._load([key for key, _ in rows], size)), cursor
+
+    def _project(self, rows):
+        if self.mode is None:
+            for values in rows:
+                yield self.model.initialize_object(dict(zip(self.fields, values)), self.fields)
+            return
+        _concrete_fields = getattr(self.model, CONCRETE_FIELDS)
+        decoders = [_concrete_fields[field].to_python for field in self.fields]
+        for values in rows:
+            values = [decode(value) for decode, value in zip(decoders, values)]
+            if self.mode == VALUES:
+                yield dict(zip(self.fields, values))
+            elif self.mode == FLAT:
+                yield values[0]
+            else:
+                yield tuple(values)
+
+    def count(self):
+        # 查询字段正好是一个索引时只读一次计数器, 否则只数主键, 不读取对象
+        if self._result is not None:
+            return len(self._result)
+        if self.empty:
+            return 0
+        if self.ranges:
+            _, count, residual = self._sorted_plan()
+            if count and not residual and not self.excludes:
+                return self.model._count_sorted(count)
+        elif not self.excludes:
+            count_name = self.model._exact_count_name(self.params)
+            if count_name:
+                return int(self.model._get_counter(count_name))
+        return sum(len(primary_keys) for primary_keys in self._primary_key_chunks(DEFAULT_BATCH_SIZE))
+
+    async def acount(self):
+        if self._result is not None:
+            return len(self._result)
+        if self.empty:
+            return 0
+        if self.ranges:
+            _, count, residual = self._sorted_plan()
+            if count and not residual and not self.excludes:
+                return await self.model._acount_sorted(count)
+        elif not self.excludes:
+            count_name = self.model._exact_count_name(self.params)
+            if count_name:
+                return int(await self.model._aget_counter(count_name))
+        return sum([len(primary_keys) async for primary_keys in self._aprimary_key_chunks(DEFAULT_BATCH_SIZE)])
+
+    def exists(self):
+        if self._result is not None:
+            return bool(self._result)
+        if self.empty:
+            return False
+        if not self.excludes and not self.ranges:
+            count_name = self.model._exact_count_name(self.params)
+            if count_name:
+                return int(self.model._get_counter(count_name)) > 0
+        return any(self._primary_key_chunks(DEFAULT_BATCH_SIZE))
+
+    async def aexists(self):
+        # 找到第一个命中的主键就停止读取索引
+        if self._result is not None:
+            return bool(self._result)
+        if self.empty:
+            return False
+        if not self.excludes and not self.ranges:
+            count_name = self.model._exact_count_name(self.params)
+            if count_name:
+                return int(await self.model._aget_counter(count_name)) > 0
+        async for primary_keys in self._aprimary_key_chunks(DEFAULT_BATCH_SIZE):
+            if primary_keys:
+                return True
+        return False
+
+    def to_columns(self, *fields, chunk_size=DEFAULT_BATCH_SIZE, arrays=True):
+        # 按列批量解码, 不创建 model 实例
+        # 安装了 numpy 且 arrays 为 True 时, IntegerField/BoolField/DatetimeField 返回 numpy 数组
+        fields = self._check_fields(fields)
+        numpy = load_numpy() if arrays else None
+        _concrete_fields = getattr(self.model, CONCRETE_FIELDS)
+        decoders = [column_decoder(_concrete_fields[field], numpy) for field in fields]
+        chunks = [[] for _ in fields]
+        for primary_keys in self._primary_key_chunks(chunk_size):
+            rows = self.model._fetch_fields(primary_keys, fields, chunk_size)
+            if not rows:
+                continue
+            for columns, decode, values in zip(chunks, decoders, zip(*rows)):
+                columns.append(decode(values))
+        columns = {}
+        for field, decode, values in zip(fields, decoders, chunks):
+            if not values:
+                values = [decode([])]
+            if isinstance(values[0], list):
+                columns[field] = list(chain.from_iterable(values))
+            else:
+                columns[field] = numpy.concatenate(values)
+        return columns
+
+    def _fetch_all(self):
+        if self._result is None:
+            self._result = list(self.iterator())
+        return self._result
+
+    def __iter__(self):
+        return iter(self._fetch_all())
+
+    def __len__(self):
+        return len(self._fetch_all())
+
+    def __bool__(self):
+        return self.exists()
+
+    def __getitem__(self, item):
+        if self._result is not None:
+            return self._result[item]
+        if isinstance(item, slice):
+            start, stop, step = item.start or 0, item.stop, item.step or 1
+            if start < 0 or (stop is not None and stop < 0) or step < 0:
+                return self._fetch_all()[item]
+            chunk_size = min(stop, DEFAULT_BATCH_SIZE) if stop else DEFAULT_BATCH_SIZE
+            return list(islice(self.iterator(max(chunk_size, 1)), start, stop, step))
+        if item < 0:
+            return self._fetch_all()[item]
+        try:
+            return next(islice(self.iterator(min(item + 1, DEFAULT_BATCH_SIZE)), item, None))
+        except StopIteration:
+            raise IndexError(item)
+
+    def __repr__(self):
+        ranges = f' {self.ranges}' if self.ranges else ''
+        ordering = f' order by {self.ordering}' if self.ordering else ''
+        return f'<QuerySet {self.model.__name__} {self.params}{ranges}{ordering}>'
@@ -15,6 +15,7 @@ setup(
     tests_require=tests_require,
     extras_require={
         'test': tests_require,
+        'numpy': ['numpy'],
     }
 )
 
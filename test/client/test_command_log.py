@@ -0,0 +1,28 @@
+import logging
+from client.command_log import CommandLog, summarize
+
+
+class Test_CommandLog:
+
+    def test_summarize_truncates_large_payloads(self):
+        assert summarize({'a': 1}) == "{'a': 1}"
+        assert summarize({str(i): i for i in range(100)}, max_items=2) == "{'0': 0, '1': 1}...(100 items)"
+        assert summarize(list(range(100)), max_items=3) == '[0, 1, 2]...(100 items)'
+        assert summarize('x' * 20, max_length=5) == "'xxxx...(22 chars)"
+
+    def test_disabled_log_skips_formatting(self, caplog):
+        caplog.set_level(logging.INFO, logger='redisorm.client')
+        command_log = CommandLog()
+        assert not command_log.enabled
+        command_log.log('GET', ('a',), 'b', 1)
+        assert not caplog.records
+
+    def test_slow_commands_only(self, caplog):
+        caplog.set_level(logging.INFO, logger='redisorm.client')
+        command_log = CommandLog(slow_threshold=0.5)
+        assert command_log.enabled
+        command_log.log('GET', ('fast',), 'b', 0.1)
+        command_log.log('HGETALL', ('slow',), {str(i): i for i in range(100)}, 1)
+        assert [record.levelno for record in caplog.records] == [logging.WARNING]
+        assert 'HGETALL' in caplog.records[0].getMessage()
+        assert '(100 items)' in caplog.records[0].getMessage()
@@ -0,0 +1,78 @@
+from client.memory_client import InMemoryClient
+
+
+class Test_InMemoryClient:
+
+    def test_counters_and_values(self):
+        client = InMemoryClient()
+        assert client.increase_by_name('a') == 1
+        assert client.increase_by_name('a', 5) == 6
+        assert client.decrease_by_name('a') == 5
+        assert client.get_by_names(['a', 'b']) == ['5', None]
+        assert client.set_value_if_name_not_exists('b', 1)
+        assert not client.set_value_if_name_not_exists('b', 2)
+        assert client.get_by_name('b') == '1'
+        assert client.unlink_by_names(['a', 'b', 'c']) == 2
+        assert not client.check_name('a')
+
+    def test_hashes(self):
+        client = InMemoryClient()
+        assert client.set_hash_mapping('h', {'a': 1, 'b': 'x'}) == 2
+        assert client.set_hash('h', 'a', 2) == 0
+        assert client.get_all_hash_by_name('h') == {'a': '2', 'b': 'x'}
+        assert client.get_hash_by_name_and_keys('h', ['b', 'c']) == ['x', None]
+        assert client.check_hash_by_name_and_key('h', 'a')
+        assert client.delete_hash_by_name_and_key('h', 'a') == 1
+        assert client.delete_hash_by_name_and_key('h', 'b') == 1
+        assert not client.check_name('h')
+
+    def test_scan_hash(self):
+        client = InMemoryClient()
+        client.set_hash_mapping('h', {str(i): i for i in range(5)})
+        cursor, values = client.scan_hash_by_name('h', 0, 2)
+        assert cursor == 2 and values == {'0': '0', '1': '1'}
+        cursor, values = client.scan_hash_by_name('h', cursor, 3)
+        assert cursor == 0 and list(values) == ['2', '3', '4']
+        assert client.scan_hash_by_name('missing') == (0, {})
+
+    def test_filter_hash_names(self):
+        client = InMemoryClient()
+        client.set_hash_mapping('a', {'x': 1, 'y': 'b'})
+        client.set_hash_mapping('b', {'x': 2, 'y': 'b'})
+        assert client.filter_hash_names(['a', 'b', 'c'], [(True, {'y': 'b'})]) == ['a', 'b']
+        assert client.filter_hash_names(['a', 'b'], [(True, {'y': 'b'}), (False, {'x': 1})]) == ['b']
+        assert client.filter_hash_names(['a', 'c'], [(True, {'z': None})]) == ['a', 'c']
+
+    def test_sorted_members(self):
+        client = InMemoryClient()
+        assert client.add_sorted_members('z', {'a': 3, 'b': 1, 'c': 3, 'd': 2}) == 4
+        assert client.range_sorted_by_score('z') == [('b', 1.0), ('d', 2.0), ('a', 3.0), ('c', 3.0)]
+        assert client.range_sorted_by_score('z', '(1', 3, 1, 2) == [('a', 3.0), ('c', 3.0)]
+        assert client.range_sorted_by_score('z', maximum=3, count=2, desc=True) == [('c', 3.0), ('a', 3.0)]
+        assert client.count_sorted_by_score('z', 2, '(3') == 1
+        assert client.range_sorted_by_lex('z', '(a', '[c') == ['b', 'c']
+        assert client.range_sorted_by_lex('z', '-', '(c', 1, 5, desc=True) == ['a']
+        assert client.count_sorted_by_lex('z', '[b', '+') == 3
+        assert client.remove_sorted_members('z', ['a', 'b', 'c', 'd', 'missing']) == 4
+        assert not client.check_name('z')
+
+    def test_pipeline_and_index_members(self):
+        client = InMemoryClient()
+        with client.pipeline() as pipe:
+            pipe.set_value_if_name_not_exists('u', 1)
+            pipe.add_index_members('t-size', 't-count', 't-partition', 't-', ['a', 'b', 'c'], 2)
+        assert pipe.results == [True, [1, 1, 2]]
+        assert client.get_all_hash_by_name('t-2') == {'c': '1'}
+        assert client.remove_index_members('t-count', 't-1', ['a', 'missing']) == 1
+        assert client.get_by_name('t-count') == '2'
+        client.delete_all()
+        assert client.store == {}
+
+    def test_round_trips(self):
+        client = InMemoryClient()
+        client.increase_by_name('a')
+        client.add_index_members('t-size', 't-count', 't-partition', 't-', ['a', 'b'], 2)
+        with client.pipeline() as pipe:
+            pipe.increase_by_name('a')
+            pipe.get_by_name('a')
+        assert client.round_trips == 3
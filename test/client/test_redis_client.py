@@ -0,0 +1,64 @@
+import pytest
+from client import conn
+from client.memory_client import InMemoryClient
+
+pytestmark = pytest.mark.skipif(isinstance(conn, InMemoryClient), reason='requires the redis backend')
+
+
+class Test_RedisClient:
+
+    def test_add_index_members_rolls_partition_over(self):
+        conn.delete_all()
+        partitions = conn.add_index_members('t-size', 't-count', 't-partition', 't-', ['a', 'b', 'c'], 2)
+        assert partitions == [1, 1, 2]
+        assert conn.add_index_members('t-size', 't-count', 't-partition', 't-', ['d'], 2) == [2]
+        assert conn.get_by_name('t-count') == '4'
+        assert conn.get_by_name('t-partition') == '2'
+        assert sorted(conn.get_all_hash_by_name('t-2')) == ['c', 'd']
+        assert conn.remove_index_members('t-count', 't-2', ['c', 'missing']) == 1
+        assert conn.get_by_name('t-count') == '3'
+        conn.delete_all()
+
+    def test_add_index_members_declares_partition_keys(self):
+        conn.delete_all()
+        assert conn.add_index_members('t-size', 't-count', 't-partition', 't-', list('abcde'), 2) == [1, 1, 2, 2, 3]
+        assert conn.partition_hints['t-partition'] == 3
+        # 分区号过期时脚本不写入, 按返回的当前分区重试
+        conn.partition_hints['t-partition'] = 7
+        assert conn.add_index_members('t-size', 't-count', 't-partition', 't-', ['f', 'g'], 2) == [3, 4]
+        conn.partition_hints['t-partition'] = 1
+        with conn.pipeline() as pipe:
+            pipe.add_index_members('t-size', 't-count', 't-partition', 't-', ['h'], 2)
+            pipe.get_by_name('t-count')
+        assert pipe.results == [[4], '7'] and conn.partition_hints['t-partition'] == 4
+        assert [sorted(conn.get_all_hash_by_name(f't-{i}')) for i in range(1, 5)] == [
+            ['a', 'b'], ['c', 'd'], ['e', 'f'], ['g', 'h']
+        ]
+        conn.delete_all()
+
+    def test_pipeline_reloads_flushed_scripts(self):
+        conn.delete_all()
+        conn.redis_conn.script_flush()
+        with conn.pipeline() as pipe:
+            pipe.set_value_if_name_not_exists('t-unique', 1)
+            pipe.add_index_members('t-size', 't-count', 't-partition', 't-', ['a'], 2)
+        assert pipe.results == [True, [1]]
+        conn.redis_conn.script_flush()
+        assert conn.remove_index_members('t-count', 't-1', ['a']) == 1
+        conn.delete_all()
+
+    def test_sorted_members_match_memory_client(self):
+        conn.delete_all()
+        client = InMemoryClient()
+        for backend in (conn, client):
+            assert backend.add_sorted_members('z', {'a': 3, 'b': 1, 'c': 3, 'd': 2}) == 4
+        for args in [(), ('(1', 3, 1, 2), ('-inf', 3, 0, 2, True), ('-inf', '+inf', 0, None, True)]:
+            assert conn.range_sorted_by_score('z', *args) == client.range_sorted_by_score('z', *args)
+        assert conn.count_sorted_by_score('z', '(1', 3) == client.count_sorted_by_score('z', '(1', 3) == 3
+        for backend in (conn, client):
+            backend.add_sorted_members('lex', {member: 0 for member in ['a\0x', 'ab', 'b\x01', 'ba', 'c']})
+        for args in [(), ('(a', '[b'), ('[a\0', '(b\x02', 1, 2), ('-', '(c', 0, 3, True)]:
+            assert conn.range_sorted_by_lex('lex', *args) == client.range_sorted_by_lex('lex', *args)
+        assert conn.count_sorted_by_lex('lex', '[b', '+') == client.count_sorted_by_lex('lex', '[b', '+') == 3
+        assert conn.remove_sorted_members('z', ['a', 'missing']) == 1
+        conn.delete_all()
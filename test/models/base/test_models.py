@@ -1,7 +1,14 @@
+import asyncio
+import time
 import pytest
-from exception.exceptions import ValueRequiredException
+from datetime import datetime, timedelta
+from exception.exceptions import (
+    ValueRequiredException, DuplicatedValueError, ObjectNotFoundException, InvalidInputException,
+)
 from models.base.models import BaseModel
-from models.base.fields import ForeignField, CharField, BoolField, DatetimeField, ListField, JsonField, IntegerField
+from models.base.fields import (
+    ForeignField, CharField, BoolField, DatetimeField, ListField, JsonField, IntegerField, CounterField,
+)
 
 
 class Test(BaseModel):
@@ -30,9 +37,50 @@ class Process(BaseModel):
     class Meta:
         unique_together = [['name', 'version']]
         indexes = [['name', 'created'], ['name', 'updated'], ['version']]
+        ordered_indexes = [('created',), ('updated',), ('version',)]
+        lex_indexes = [('name', 'version')]
         hash_name = 'process'
 
 
+class CachedProcess(BaseModel):
+    name = CharField()
+    version = IntegerField()
+
+    class Meta:
+        unique_together = [['name', 'version']]
+        hash_name = 'cached_process'
+        cache = {'maxsize': 2, 'ttl': 60}
+
+
+class PubSubProcess(BaseModel):
+    name = CharField()
+
+    class Meta:
+        hash_name = 'pubsub_process'
+        cache = {'invalidation': 'pubsub'}
+
+
+class Batch(BaseModel):
+    name = CharField()
+    retries = CounterField()
+    processed = CounterField()
+
+    class Meta:
+        hash_name = 'batch'
+        indexes = [['name']]
+        ordered_indexes = [('name', '-processed')]
+        cache = {'maxsize': 10}
+
+
+class Task(BaseModel):
+    group = IntegerField()
+    version = IntegerField()
+
+    class Meta:
+        indexes = [['group'], ['version']]
+        hash_name = 'task'
+
+
 class Test_Model:
 
     def test_test_model_happy_case(self):
@@ -63,6 +111,97 @@ class Test_Model:
         assert test.req.value == 'a'
         assert sorted([['uni'], ['uni1'], ['uni1', 'uni2'], ['ind1'], ['ind1', 'ind2']]) == sorted(test.indexes)
 
+    def test_process_instances_do_not_share_values(self):
+        first = Process(name='first', version=1, scheme={'a': 1})
+        second = Process(name='second')
+        assert first.name.value == 'first' and second.name.value == 'second'
+        assert second.version.value == 0 and second.scheme.value == {}
+        first.name.value = 'changed'
+        second.version = 2
+        assert second.name.value == 'second' and second.version.value == 2
+        assert Process.name.value == '' and isinstance(Process.name, CharField)
+        assert 'name' not in vars(first)
+
+    def test_process_codecs_round_trip(self):
+        process = Process(name='test', version=3, scheme={'a': [1]}, deprecated=True)
+        process._deal_fields()
+        mapping = process._build_model({}, {'name-test': 1}, 2)
+        assert mapping['version'] == '3' and mapping['deprecated'] == '1' and mapping['primary_position'] == 2
+        loaded = Process.initialize_object({key: str(value) for key, value in mapping.items()})
+        assert loaded.version.value == 3 and loaded.deprecated.value is True
+        assert loaded.scheme.value == {'a': [1]} and loaded.created.value == process.created.value
+        assert Process._keys.primary(3) == 'process-3'
+        assert process._unique_names() == ['process-unique-name-test-version-3']
+        assert 'name-test-version-3' in process._index_values()
+
+    def test_test_model_get_indexes(self):
+        assert Test.get_indexes({'ind2': 1, 'ind1': 2, 'req': 'a'}) == ['ind1', 'ind2']
+        assert Test.get_indexes({'uni2': 1, 'uni1': 2, 'ind1': 3}) == ['uni1', 'uni2']
+        assert Test.get_indexes({'ind2': 1}) == []
+        # 字段很多时也不会枚举所有排列
+        params = {key: 1 for key in ['key', 'uni', 'uni1', 'uni2', 'ind1', 'ind2', 'req']}
+        params.update({f'extra{i}': 1 for i in range(10)})
+        assert Test.get_indexes(params) in Test.unique_keys
+        assert frozenset(params) in Test._index_plans
+
+    def test_task_cost_based_index_and_explain(self):
+        from client import conn
+        conn.delete_all()
+        Task.bulk_create([Task(group=1, version=i % 10) for i in range(30)])
+        assert Task.get_indexes({'group': 1, 'version': 3}) == ['version']
+        assert Task.get_indexes({'group': 2, 'version': 3}) == ['group']
+        plan = Task.explain(group=1, version=3)
+        assert plan['index'] == ['version'] and plan['estimated_rows'] == 3
+        assert plan['indexes'] == [['version'], ['group']]
+        assert plan['residual'] == [] and not plan['unique']
+        assert {'index': ['group'], 'rows': 30} in plan['candidates']
+        assert plan['round_trips'] == 5
+        # 第一次执行时 redis 客户端还要加载脚本
+        assert len(Task.filter(group=1, version=3)) == 3
+        round_trips = conn.round_trips
+        assert len(Task.filter(group=1, version=3)) == 3
+        assert conn.round_trips - round_trips == 5
+        assert Process.explain(name='test', version=1)['unique']
+        assert Task.explain(group=1, version=3, missing=1)['residual'] == ['missing']
+        conn.delete_all()
+
+    def test_task_reads_every_index_partition(self, monkeypatch):
+        from client import conn, aconn
+        conn.delete_all()
+        monkeypatch.setattr('models.base.models.BIG_KEY_LIMIT', 3)
+        monkeypatch.setattr('models.base.models.DEFAULT_SCAN_COUNT', 2)
+        monkeypatch.setattr('models.base.models.SCAN_PARTITIONS', 2)
+        primary_keys = [Task(group=1, version=i).save() for i in range(10)]
+        assert conn.get_by_name('task-index-group-1_partition') == '4'
+        assert sorted(Task._get_index([['group']], {'group': 1})) == sorted(str(key) for key in primary_keys)
+        assert len(Task.filter(group=1)) == 10
+
+        async def run():
+            result = await Task.afilter(group=1)
+            await aconn.close()
+            return result
+        assert len(asyncio.run(run())) == 10
+        conn.delete_all()
+
+    def test_task_intersects_indexes(self, monkeypatch):
+        from client import conn, aconn
+        conn.delete_all()
+        monkeypatch.setattr('models.base.models.BIG_KEY_LIMIT', 4)
+        monkeypatch.setattr('models.base.models.DEFAULT_SCAN_COUNT', 3)
+        Task.bulk_create([Task(group=i % 3, version=i % 5) for i in range(30)])
+        assert Task.get_index_plan({'group': 1, 'version': 3}) == [['version'], ['group']]
+        expected = sorted(task.id.value for task in Task.filter() if task.group.value == 1 and task.version.value == 3)
+        assert len(expected) == 2
+        assert sorted(task.id.value for task in Task.filter(group=1, version=3)) == expected
+        assert not Task.filter(group=5, version=3)
+
+        async def run():
+            result = await Task.afilter(group=1, version=3)
+            await aconn.close()
+            return result
+        assert sorted(task.id.value for task in asyncio.run(run())) == expected
+        conn.delete_all()
+
     def test_test_model_bad_case_without_required_value(self):
         with pytest.raises(ValueRequiredException):
             Test(key=1, uni=2, uni1=3, uni2=4, ind1=5, ind2=6)
@@ -84,3 +223,377 @@ class Test_Model:
             process = Process.get(name=f'test-{i}', version=1)
             assert process.id.value == id_list[i]
         conn.delete_all()
+
+    def test_process_save_twice_and_delete(self):
+        from client import conn
+        conn.delete_all()
+        process = Process(name='test', version=1, scheme={'test': 1})
+        primary_key = process.save()
+        assert process.save() == primary_key
+        assert conn.get_by_name('process-index-version-1_count') == '1'
+        assert conn.get_by_name('process-index-process-primary_count') == '1'
+        process.delete()
+        assert not conn.check_name(f'process-{primary_key}')
+        assert not conn.check_name('process-unique-name-test-version-1')
+        assert conn.get_by_name('process-index-version-1_count') == '0'
+        conn.delete_all()
+
+    def test_test_model_duplicated_unique_value_rolls_back(self):
+        from client import conn
+        conn.delete_all()
+        Test(key=1, uni=2, uni1=3, uni2=4, req='a').save()
+        with pytest.raises(DuplicatedValueError):
+            Test(key=2, uni=5, uni1=3, uni2=4, req='a').save()
+        assert not conn.check_name('test-2')
+        assert Test(key=3, uni=5, uni1=6, uni2=7, req='a').save() == 3
+        conn.delete_all()
+
+    def test_process_bulk_create(self):
+        from client import conn
+        conn.delete_all()
+        Process(name='test-0', version=1).save()
+        processes = [Process(name=f'test-{i}', version=1, scheme={'test': i}) for i in range(5)]
+        processes.append(Process(name='test-1', version=1))
+        created, failed = Process.bulk_create(processes, batch_size=2)
+        assert [process.name.value for process in created] == ['test-1', 'test-2', 'test-3', 'test-4']
+        assert [process for process, _ in failed] == [processes[0], processes[5]]
+        assert all(isinstance(error, DuplicatedValueError) for _, error in failed)
+        assert conn.get_by_name('process-index-version-1_count') == '5'
+        for process in created:
+            assert Process.get(id=process.id.value).scheme.value == process.scheme.value
+        assert len(Process.filter(version=1)) == 5
+        created[0].delete()
+        assert conn.get_by_name('process-index-version-1_count') == '4'
+        conn.delete_all()
+
+    def test_process_bulk_create_repeated_primary_keys(self):
+        from client import conn
+        conn.delete_all()
+        processes = [
+            Process(id=7, name='a', version=1), Process(id=7, name='b', version=1),
+            Process(id=8, name='c', version=1), Process(id='7', name='d', version=1),
+        ]
+        # 同一批与之后批次中重复的主键都与已存在的主键一样失败
+        created, failed = Process.bulk_create(processes, batch_size=2)
+        assert created == [processes[0], processes[2]]
+        assert [process for process, _ in failed] == [processes[1], processes[3]]
+        assert all(isinstance(error, DuplicatedValueError) for _, error in failed)
+        assert Process.count() == 2 and conn.get_by_name('process-index-version-1_count') == '2'
+        assert Process.get(name='a', version=1).id.value == 7
+        assert not conn.check_name('process-unique-name-b-version-1')
+        assert not conn.check_name('process-unique-name-d-version-1')
+        conn.delete_all()
+
+    def test_process_range_lookups(self):
+        from client import conn
+        conn.delete_all()
+        start = datetime(2024, 1, 1)
+        Process.bulk_create([
+            Process(name=f'test-{i}', version=i, created=start + timedelta(minutes=i)) for i in range(10)
+        ])
+        since = start + timedelta(minutes=7)
+        assert sorted(process.version.value for process in Process.filter(created__gte=since)) == [7, 8, 9]
+        assert [process.version.value for process in Process.filter(created__gt=since)] == [8, 9]
+        assert Process.filter(created__between=(start, since)).count() == 8
+        assert Process.filter(version__gt=2, version__lte=5).values_list('version', flat=True)[:] == [3, 4, 5]
+        assert Process.filter(version__gt=5, version__lt=5).count() == 0
+        assert [process.version.value for process in Process.filter(
+            version__between=(2, 8), name='test-4'
+        )] == [4]
+        assert Process.filter(version__gte=3).order_by('-version').values_list('version', flat=True)[:2] == [9, 8]
+        round_trips = conn.round_trips
+        assert Process.filter(created__lt=since.strftime('%Y-%m-%d %H:%M:%S')).count() == 7
+        assert conn.round_trips - round_trips == 1
+        with pytest.raises(InvalidInputException):
+            Process.filter(version__in=[1])
+        with pytest.raises(InvalidInputException):
+            Process.filter(version__startswith='1')
+        with pytest.raises(InvalidInputException):
+            list(Process.filter(version__gt=1, created__gt=start))
+        conn.delete_all()
+
+    def test_process_lex_lookups(self):
+        from client import conn
+        conn.delete_all()
+        names = ['etl-a', 'etl-b', 'etl', 'etm', 'ab', 'etl-a']
+        Process.bulk_create([Process(name=name, version=i) for i, name in enumerate(names)])
+        round_trips = conn.round_trips
+        assert Process.filter(name__startswith='etl').values_list('name', 'version')[:] == [
+            ('etl', 2), ('etl-a', 0), ('etl-a', 5), ('etl-b', 1)
+        ]
+        assert conn.round_trips - round_trips == 2
+        assert Process.filter(name__startswith='etl-', version=5).values_list('version', flat=True)[:] == [5]
+        assert Process.filter(name__gt='etl', name__lte='etl-b').count() == 3
+        assert Process.filter(name__between=('ab', 'etl')).count() == 2
+        assert Process.filter(name__lt='etl-a').order_by('-name').values_list('name', flat=True)[:] == ['etl', 'ab']
+        assert Process.filter(name__startswith='').count() == 6
+        assert Process.filter(name__startswith='etl', deprecated=False).count() == 4
+        queryset = Process.filter(name__startswith='e').order_by('name')
+        first, cursor = queryset.page(2)
+        second, cursor = queryset.page(2, after=cursor)
+        third, cursor = queryset.page(2, after=cursor)
+        assert [(process.name.value, process.version.value) for process in first + second + third] == [
+            ('etl', 2), ('etl-a', 0), ('etl-a', 5), ('etl-b', 1), ('etm', 3)
+        ]
+        assert cursor is None
+        assert Process.filter(name='etl-a', version__gte=1).count() == 1
+        process = Process.get(id=1)
+        process.name = 'zz'
+        process.save()
+        assert Process.filter(name__startswith='etl-').count() == 2
+        process.delete()
+        assert Process.filter(name__gte='z').count() == 0
+        conn.delete_all()
+
+    def test_process_partial_update(self):
+        from client import conn
+        conn.delete_all()
+        primary_key = Process(name='test', version=1, scheme={'a': 1}).save()
+        process = Process.get(id=primary_key)
+        conn.set_hash(f'process-{primary_key}', 'scheme', '{"remote": 1}')
+        process.update(deprecated=True)
+        stored = Process.get(id=primary_key)
+        assert stored.deprecated.value is True and stored.scheme.value == {'remote': 1}
+        round_trips = conn.round_trips
+        assert stored.save() == primary_key
+        assert conn.round_trips == round_trips
+        stored.scheme = {'b': 2}
+        stored.name = 'ignored'
+        stored.save(update_fields=['scheme'])
+        assert Process.get(id=primary_key).scheme.value == {'b': 2}
+        assert Process.get(id=primary_key).name.value == 'test'
+        # 没有索引的字段: 一次 HMGET 加一次 pipeline
+        test = Test(key=1, uni=2, uni1=3, uni2=4, req='a')
+        test.save()
+        round_trips = conn.round_trips
+        test.update(req='b')
+        assert conn.round_trips - round_trips == 2
+        assert conn.get_hash_by_name_and_key('test-1', 'req') == 'b'
+        conn.delete_all()
+
+    def test_process_update_moves_touched_indexes(self):
+        from client import conn
+        conn.delete_all()
+        primary_key = Process(name='test', version=1).save()
+        other_key = Process(name='other', version=2).save()
+        process = Process.get(id=primary_key)
+        process.version = 2
+        process.save()
+        assert conn.get_by_name('process-index-version-1_count') == '0'
+        assert conn.get_by_name('process-index-version-2_count') == '2'
+        assert conn.get_by_name('process-index-name-test_count') == '1'
+        assert not conn.check_name('process-unique-name-test-version-1')
+        assert Process.get(name='test', version=2).id.value == primary_key
+        assert Process.filter(version__gte=2).count() == 2
+        assert Process.filter(name__startswith='te', version=2).values_list('id', flat=True)[:] == [primary_key]
+        with pytest.raises(DuplicatedValueError):
+            Process.get(id=other_key).update(name='test')
+        assert Process.get(id=other_key).name.value == 'other'
+        assert conn.get_by_name('process-unique-name-other-version-2') == str(other_key)
+        process.delete()
+        Process.get(id=other_key).delete()
+        for name in [
+            'process-ordered-by-version', 'process-lex-name-version', 'process-unique-name-test-version-2',
+            'process-index-version-2-1', 'process-index-name-test-1',
+        ]:
+            assert not conn.check_name(name)
+        conn.delete_all()
+
+    def test_stale_instances_update_indexes_from_stored_values(self):
+        from client import conn
+        conn.delete_all()
+        primary_key = Process(name='a', version=1).save()
+        x, y = Process.get(id=primary_key), Process.get(id=primary_key)
+        x.update(name='b')
+        # y 中的 name 已经过期, 新的唯一键与字典序成员按 redis 中的 name 计算
+        y.update(version=2)
+        assert Process.filter(name='b', version=2).count() == 1
+        assert not Process.filter(name='a', version=2) and not Process.filter(name='a').count()
+        assert Process.get(name='b', version=2).id.value == primary_key
+        assert not conn.check_name('process-unique-name-a-version-2')
+        assert Process.filter(name__startswith='b', version=2).values_list('id', flat=True)[:] == [primary_key]
+        assert not Process.filter(name__startswith='a').exists()
+        conn.delete_all()
+
+    def test_process_async_update(self):
+        from client import conn, aconn
+        conn.delete_all()
+        primary_key = Process(name='test', version=1).save()
+
+        async def run():
+            process = await Process.aget(id=primary_key)
+            await process.aupdate(version=3)
+            await aconn.close()
+        asyncio.run(run())
+        assert Process.get(name='test', version=3).id.value == primary_key
+        assert Process.count(version=1) == 0
+        conn.delete_all()
+
+    def test_batch_counters(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from client import conn
+        conn.delete_all()
+        batch = Batch(name='etl')
+        primary_key = batch.save()
+        other_key = Batch(name='etl').save()
+        Batch.incr(other_key, 'processed', 50)
+        round_trips = conn.round_trips
+        assert batch.incr('retries') == 1
+        assert conn.round_trips - round_trips == 1
+        assert batch.retries.value == 1
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda _: Batch.incr(primary_key, 'processed', 2), range(40)))
+        assert Batch.get(id=primary_key).processed.value == 80
+        assert Batch.filter(name='etl').order_by('-processed').values_list('id', flat=True)[:] == [
+            primary_key, other_key
+        ]
+        assert Batch.filter(name='etl', processed__lt=60).values_list('id', flat=True)[:] == [other_key]
+        # 旧对象保存其他字段时不会覆盖计数
+        batch.update(name='etl')
+        batch.name = 'renamed'
+        batch.save()
+        stored = Batch.get(id=primary_key)
+        assert stored.processed.value == 80 and stored.retries.value == 1 and stored.name.value == 'renamed'
+        assert Batch.filter(name='renamed', processed__gte=80).count() == 1
+        # 有序索引的名字由 hash 中记录的列表校验, 过期的对象重试后写入正确的 sorted set
+        stored.update(name='moved')
+        assert batch.incr('processed', 5) == 85
+        assert Batch.filter(name='moved').order_by('-processed').page(1)[0][0].processed.value == 85
+        assert Batch.filter(name='renamed').order_by('processed').count() == 0
+        assert Batch.filter(name='moved', processed__gte=85).count() == 1
+        # 移动有序索引时计数的分数取 redis 中的值, 不用对象读取时的旧值
+        stale = Batch.get(id=other_key)
+        Batch.incr(other_key, 'processed', 50)
+        stale.update(name='moved')
+        assert Batch.filter(name='moved', processed__gte=100).values_list('id', flat=True)[:] == [other_key]
+        with pytest.raises(ObjectNotFoundException):
+            Batch.incr(100, 'retries')
+        assert not conn.check_name('batch-100')
+        with pytest.raises(InvalidInputException):
+            batch.incr('name')
+        with pytest.raises(InvalidInputException):
+            type('Bad', (BaseModel,), {'count': CounterField(), 'Meta': type('Meta', (), {'indexes': [['count']]})})
+        conn.delete_all()
+
+    def test_batch_async_counters(self):
+        from client import conn, aconn
+        conn.delete_all()
+        batch = Batch(name='etl')
+        primary_key = batch.save()
+
+        async def run():
+            result = await batch.aincr('retries', 3), await Batch.aincr(primary_key, 'retries', -1)
+            await aconn.close()
+            return result
+        assert asyncio.run(run()) == (3, 2)
+        assert batch.retries.value == 3 and Batch.get(id=primary_key).retries.value == 2
+        conn.delete_all()
+
+    def test_process_in_bulk(self):
+        from client import conn
+        conn.delete_all()
+        primary_keys = [Process(name=f'test-{i}', version=i).save() for i in range(5)]
+        processes = Process.in_bulk(primary_keys + [100], chunk_size=2)
+        assert list(processes) == primary_keys
+        for i, primary_key in enumerate(primary_keys):
+            assert processes[primary_key].name.value == f'test-{i}'
+        assert Process.in_bulk([]) == {}
+        conn.delete_all()
+
+    def test_process_async_api(self):
+        from client import conn, aconn
+
+        async def run():
+            primary_keys = await asyncio.gather(*[
+                Process(name=f'test-{i}', version=1, scheme={'test': i}).asave() for i in range(10)
+            ])
+            process = await Process.aget(id=primary_keys[3])
+            assert process.scheme.value == {'test': 3}
+            assert (await Process.aget(name='test-4', version=1)).id.value == primary_keys[4]
+            assert len(await Process.afilter(version=1)) == 10
+            assert list(await Process.ain_bulk(primary_keys, chunk_size=3)) == list(primary_keys)
+            await process.adelete()
+            assert len(await Process.afilter(version=1)) == 9
+            await aconn.close()
+
+        conn.delete_all()
+        asyncio.run(run())
+        conn.delete_all()
+
+    def test_cached_process_get_and_invalidate(self):
+        from client import conn
+        conn.delete_all()
+        process = CachedProcess(name='test', version=1)
+        primary_key = process.save()
+        assert CachedProcess.get(id=primary_key).name.value == 'test'
+        assert CachedProcess.get(id=primary_key).name.value == 'test'
+        assert CachedProcess.cache_info()['hits'] == 1
+        # 本进程保存后本地缓存失效
+        process.name.value = 'changed'
+        process.save()
+        assert CachedProcess.get(id=primary_key).name.value == 'changed'
+        # 其他进程写入时版本号变化
+        conn.set_hash_mapping(f'cached_process-{primary_key}', {'name': 'remote'})
+        conn.increase_by_name(f'cached_process-{primary_key}-version')
+        assert CachedProcess.get(id=primary_key).name.value == 'remote'
+        primary_keys = [CachedProcess(name=f'test-{i}', version=1).save() for i in range(3)]
+        for key in primary_keys:
+            CachedProcess.get(id=key)
+        info = CachedProcess.cache_info()
+        assert info['size'] == 2 and info['evictions'] >= 1
+        CachedProcess.get(id=primary_keys[0]).delete()
+        with pytest.raises(ObjectNotFoundException):
+            CachedProcess.get(id=primary_keys[0])
+        assert Process.cache_info() is None
+        conn.delete_all()
+
+    def test_cached_process_version_expires_after_delete(self, monkeypatch):
+        from client import conn
+        conn.delete_all()
+        monkeypatch.setattr(CachedProcess._cache, 'ttl', 0.05)
+        process = CachedProcess(name='test', version=1)
+        primary_key = process.save()
+        version_name = f'cached_process-{primary_key}-version'
+        process.delete()
+        assert conn.check_name(version_name)
+        time.sleep(0.1)
+        assert not conn.check_name(version_name)
+        # 重新保存后 version key 不再过期
+        process = CachedProcess(id=primary_key, name='test', version=1)
+        process.save()
+        process.delete()
+        process.save()
+        time.sleep(0.1)
+        assert conn.check_name(version_name)
+        conn.delete_all()
+
+    @pytest.mark.parametrize('ttl', [None, 0.05])
+    def test_cached_process_recreated_after_delete(self, monkeypatch, ttl):
+        from client import conn
+        conn.delete_all()
+        cache = CachedProcess._cache
+        monkeypatch.setattr(cache, 'ttl', ttl)
+        primary_key = CachedProcess(name='old', version=1).save()
+        assert CachedProcess.get(id=primary_key).name.value == 'old'
+        # 其他进程中仍然缓存着删除前的对象
+        stale = dict(cache.values)
+        CachedProcess.get(id=primary_key).delete()
+        time.sleep(0.1)
+        assert conn.check_name(f'cached_process-{primary_key}-version') == (ttl is None)
+        CachedProcess(id=primary_key, name='new', version=1).save()
+        cache.values.update(stale)
+        assert CachedProcess.get(id=primary_key).name.value == 'new'
+        conn.delete_all()
+
+    def test_pubsub_process_invalidation(self):
+        from client import conn
+        conn.delete_all()
+        primary_key = PubSubProcess(name='test').save()
+        assert PubSubProcess.get(id=primary_key).name.value == 'test'
+        conn.set_hash_mapping(f'pubsub_process-{primary_key}', {'name': 'remote'})
+        conn.publish('pubsub_process-invalidate', primary_key)
+        deadline = time.monotonic() + 5
+        while PubSubProcess.cache_info()['size'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert PubSubProcess.get(id=primary_key).name.value == 'remote'
+        conn.delete_all()
@@ -0,0 +1,359 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from exception.exceptions import InvalidInputException, ObjectNotFoundException, GetMoreObjectsException
+from models.base.models import BaseModel
+from models.base.fields import CharField, IntegerField, BoolField, DatetimeField
+from models.base.query import QuerySet
+
+
+class Job(BaseModel):
+    name = CharField()
+    group = IntegerField()
+    version = IntegerField()
+
+    class Meta:
+        hash_name = 'job'
+        unique_together = [['name']]
+        indexes = [['group', 'version']]
+        lex_indexes = [('group', 'name')]
+
+
+class Event(BaseModel):
+    done = BoolField()
+    created = DatetimeField(auto_now_add=True)
+    finished = DatetimeField()
+
+    class Meta:
+        hash_name = 'event'
+
+
+class Ticket(BaseModel):
+    name = CharField()
+    flag = BoolField()
+    due = DatetimeField()
+
+    class Meta:
+        hash_name = 'ticket'
+        unique_together = [['name', 'due']]
+        indexes = [['flag'], ['name', 'flag'], ['due']]
+
+
+class Release(BaseModel):
+    name = CharField()
+    version = IntegerField()
+    flag = BoolField()
+
+    class Meta:
+        hash_name = 'release'
+        indexes = [['name']]
+
+
+class Run(BaseModel):
+    name = CharField()
+    attempts = IntegerField()
+    updated = DatetimeField()
+
+    class Meta:
+        hash_name = 'run'
+        ordered_indexes = [('name', '-updated'), ('attempts',)]
+
+
+@pytest.fixture
+def jobs():
+    from client import conn
+    conn.delete_all()
+    Job.bulk_create([Job(name=f'job-{i}', group=i % 2, version=i % 5) for i in range(20)])
+    yield
+    conn.delete_all()
+
+
+@pytest.fixture
+def runs():
+    from client import conn
+    conn.delete_all()
+    start = datetime(2024, 1, 1)
+    Run.bulk_create([
+        Run(name='ba'[i % 2], attempts=i % 7, updated=start + timedelta(minutes=i)) for i in range(1, 31)
+    ])
+    yield
+    conn.delete_all()
+
+
+class Test_QuerySet:
+
+    def test_filter_is_lazy(self, jobs):
+        from client import conn
+        round_trips = conn.round_trips
+        queryset = Job.filter(group=1)
+        assert isinstance(queryset, QuerySet)
+        assert conn.round_trips == round_trips
+        assert len(queryset) == 10
+        assert all(job.group.value == 1 for job in queryset)
+
+    def test_empty_result_does_not_raise(self, jobs):
+        queryset = Job.filter(group=3)
+        assert not queryset
+        assert len(queryset) == 0
+        assert list(queryset) == []
+        assert not Job.filter(group=1).filter(group=0)
+
+    def test_chaining_and_exclude(self, jobs):
+        queryset = Job.filter(group=0).filter(version=2)
+        assert sorted(job.name.value for job in queryset) == ['job-12', 'job-2']
+        assert [job.name.value for job in queryset.exclude(name='job-2')] == ['job-12']
+        assert len(Job.filter(group=0).exclude(version=2)) == 8
+        assert len(Job.filter(version=3)) == 4
+        assert len(Job.filter()) == 20
+
+    def test_residual_predicates_run_server_side(self, jobs, monkeypatch):
+        requested = []
+        in_bulk = Job.in_bulk.__func__
+
+        def record(cls, primary_keys, chunk_size=1000):
+            requested.extend(primary_keys)
+            return in_bulk(cls, primary_keys, chunk_size)
+        monkeypatch.setattr(Job, 'in_bulk', classmethod(record))
+        queryset = Job.filter(version=4).exclude(group=1)
+        assert sorted(job.name.value for job in queryset) == ['job-14', 'job-4']
+        assert len(requested) == 2
+        with pytest.raises(InvalidInputException):
+            list(Job.filter(missing=1))
+
+    def test_slicing_and_iterator(self, jobs):
+        queryset = Job.filter(group=1)
+        assert len(queryset[:3]) == 3
+        assert queryset[2].group.value == 1
+        with pytest.raises(IndexError):
+            queryset[10]
+        names = [job.name.value for job in queryset.iterator(chunk_size=3)]
+        assert len(names) == 10 and len(set(names)) == 10
+        assert [job.name.value for job in queryset[-2:]] == names[-2:]
+
+    def test_values_values_list_and_only(self, jobs, monkeypatch):
+        queryset = Job.filter(group=0, version=2)
+        assert sorted(queryset.values_list('name', flat=True)) == ['job-12', 'job-2']
+        assert sorted(queryset.values_list('name', 'version')) == [('job-12', 2), ('job-2', 2)]
+        assert sorted(queryset.values('name', 'group'), key=lambda row: row['name']) == [
+            {'name': 'job-12', 'group': 0}, {'name': 'job-2', 'group': 0}
+        ]
+        assert set(queryset.values()[0]) == {'id', 'name', 'group', 'version'}
+        monkeypatch.setattr(Job, 'in_bulk', None)
+        jobs = list(queryset.only('name'))
+        assert sorted(job.name.value for job in jobs) == ['job-12', 'job-2']
+        assert all(job.id.value and job.version.value == 0 for job in jobs)
+        with pytest.raises(InvalidInputException):
+            queryset.values_list('name', 'group', flat=True)
+        with pytest.raises(InvalidInputException):
+            queryset.values('missing')
+
+    def test_only_loads_deferred_fields_before_writing(self, jobs):
+        from client import aconn
+        job = Job.filter(name='job-3').only('version')[0]
+        assert job.name.value == '' and job.group.value == 0
+        job.update(version=9)
+        assert job.name.value == 'job-3' and job.group.value == 1
+        assert Job.get(name='job-3').version.value == 9 and Job.count(group=1, version=9) == 1
+        assert Job.filter(group=1, name__startswith='job-3').count() == 1
+        # 删除时按 redis 中的 name 释放唯一键
+        Job.filter(name='job-5').only('version')[0].delete()
+        assert not Job.exists(name='job-5') and Job.count(group=1) == 9
+        Job(name='job-5', group=1, version=0).save()
+        job = Job.filter(name='job-7').only('group')[0]
+        job.name, job.version = 'job-70', 8
+
+        async def run():
+            await job.asave()
+            await aconn.close()
+        asyncio.run(run())
+        assert Job.get(name='job-70').version.value == 8 and not Job.exists(name='job-7')
+        assert Job.filter(group=1, name__startswith='job-70').count() == 1
+
+    def test_to_columns(self, jobs):
+        columns = Job.filter(group=0, version=2).to_columns('name', 'version', arrays=False)
+        assert sorted(columns['name']) == ['job-12', 'job-2'] and columns['version'] == [2, 2]
+        assert Job.filter(group=5).to_columns('name', arrays=False) == {'name': []}
+
+    def test_to_columns_numpy(self, jobs):
+        numpy = pytest.importorskip('numpy')
+        columns = Job.filter(group=1).to_columns('id', 'version', 'name', chunk_size=3)
+        assert columns['version'].dtype == numpy.int64 and len(columns['version']) == 10
+        assert sorted(columns['version'].tolist()) == sorted(i % 5 for i in range(1, 20, 2))
+        assert isinstance(columns['name'], list)
+        assert len(Job.filter(group=5).to_columns('version')['version']) == 0
+
+    def test_to_columns_numpy_bool_and_datetime(self):
+        from client import conn
+        numpy = pytest.importorskip('numpy')
+        conn.delete_all()
+        Event(done=True).save()
+        Event(done=False, finished='2024-01-02 03:04:05').save()
+        columns = Event.filter().to_columns('done', 'created', 'finished')
+        assert columns['done'].dtype == bool and sorted(columns['done'].tolist()) == [False, True]
+        assert columns['created'].dtype == numpy.dtype('datetime64[s]')
+        assert numpy.isnat(columns['finished']).sum() == 1
+        assert numpy.datetime64('2024-01-02T03:04:05') in columns['finished']
+        conn.delete_all()
+
+    def test_count_and_exists(self, jobs):
+        from client import conn
+        round_trips = conn.round_trips
+        assert Job.count(group=1) == 10
+        assert Job.count(group=0, version=2) == 2
+        assert Job.count() == 20
+        assert Job.count(name='job-3') == 1
+        assert Job.exists(group=1) and not Job.exists(group=3)
+        assert conn.round_trips - round_trips == 6
+        assert Job.count(version=3) == 4
+        assert Job.filter(group=0).exclude(version=2).count() == 8
+        assert Job.exists(version=4) and not Job.exists(version=7)
+        assert not Job.filter(group=1).filter(group=0).exists()
+        assert Job.filter(group=1)
+
+    def test_indexed_bool_and_datetime_use_stored_values(self):
+        from client import conn
+        conn.delete_all()
+        due = datetime(2024, 1, 2, 3, 4, 5, 678)
+        Ticket.bulk_create([Ticket(name='n', flag=i < 3, due=due + timedelta(days=i)) for i in range(5)])
+        assert len(Ticket.filter(flag=True)) == 3 and len(Ticket.filter(flag='1')) == 3
+        assert Ticket.count(flag=True) == 3 and Ticket.count(flag=False) == 2
+        assert Ticket.exists(flag=True) and Ticket.count(name='n', flag=True) == 3
+        assert len(Ticket.filter(name='n', flag=True)) == 3
+        assert Ticket.count(due=due) == 1 and Ticket.filter(due=due)[0].flag.value is True
+        assert Ticket.get(name='n', due=due + timedelta(days=4)).flag.value is False
+        conn.delete_all()
+
+    def test_get_checks_every_predicate(self):
+        from client import conn, aconn
+        conn.delete_all()
+        release = Release(name='a', version=1, flag=False)
+        release.save()
+        primary_key = release.id.value
+        # 索引只覆盖 name, 其余条件也必须排除唯一的候选对象
+        missing = [{'flag': True}, {'name': 'a', 'version': 99}, {'id': primary_key, 'flag': True}]
+        for params in missing:
+            with pytest.raises(ObjectNotFoundException):
+                Release.get(**params)
+        assert Release.get(name='a', flag=False).version.value == 1
+        assert Release.get(id=primary_key, name='a').version.value == 1
+        Release(name='a', version=2, flag=True).save()
+        with pytest.raises(GetMoreObjectsException):
+            Release.get(name='a')
+        assert Release.get(name='a', flag=True).version.value == 2
+
+        async def run():
+            results = []
+            for params in missing[1:] + [{'name': 'a'}]:
+                try:
+                    results.append((await Release.aget(**params)).version.value)
+                except (ObjectNotFoundException, GetMoreObjectsException) as exception:
+                    results.append(type(exception))
+            results.append((await Release.aget(name='a', version=2)).flag.value)
+            await aconn.close()
+            return results
+        assert asyncio.run(run()) == [ObjectNotFoundException] * 2 + [GetMoreObjectsException, True]
+        conn.delete_all()
+
+    def test_primary_key_lookup_skips_indexes(self, jobs):
+        from client import conn
+        primary_key = Job.get(name='job-3').id.value
+        round_trips = conn.round_trips
+        # 主键条件只检查一个对象, 不扫描主键索引
+        assert Job.count(id=primary_key) == 1 and Job.exists(id=primary_key, group=1)
+        assert not Job.exists(id=primary_key, group=0) and Job.count(id=-1) == 0
+        assert conn.round_trips - round_trips == 4
+        assert [job.name.value for job in Job.filter(id=primary_key)] == ['job-3']
+        assert not Job.filter(id=primary_key).exclude(version=3)
+
+    def test_lex_lookup_after_equality_prefix(self, jobs):
+        names = Job.filter(group=1, name__startswith='job-1').values_list('name', flat=True)
+        assert names[:] == ['job-1', 'job-11', 'job-13', 'job-15', 'job-17', 'job-19']
+        assert Job.filter(group=0, name__gte='job-5').count() == 2
+        assert Job.filter(group=0).order_by('-name').values_list('name', flat=True)[:2] == ['job-8', 'job-6']
+        with pytest.raises(InvalidInputException):
+            list(Job.filter(name__startswith='job-1'))
+
+    def test_async_count_and_exists(self, jobs):
+        from client import aconn
+
+        async def run():
+            result = (
+                await Job.acount(group=1), await Job.acount(version=3), await Job.aexists(name='job-3'),
+                await Job.aexists(group=3),
+            )
+            await aconn.close()
+            return result
+        assert asyncio.run(run()) == (10, 4, True, False)
+
+    def test_async_lookups_and_early_exit(self, jobs, monkeypatch):
+        from client import aconn
+        client = getattr(aconn, 'client', aconn)
+        monkeypatch.setattr('models.base.query.DEFAULT_BATCH_SIZE', 2)
+
+        async def run():
+            await Job.aexists(version=4)
+            round_trips = client.round_trips
+            # 每批两个主键, 第三批才有 version 为 4 的对象, 之后的批次不再读取
+            found = await Job.aexists(version=4)
+            result = (
+                found, client.round_trips - round_trips, await Job.acount(group=0, name__gte='job-5'),
+                sorted(job.name.value for job in await Job.afilter(group=1, name__startswith='job-1')),
+                await Job.aexists(group=1, name__startswith='job-2'),
+            )
+            await aconn.close()
+            return result
+        assert asyncio.run(run()) == (
+            True, 5, 2, ['job-1', 'job-11', 'job-13', 'job-15', 'job-17', 'job-19'], False
+        )
+
+
+class Test_OrderedIndexes:
+
+    def test_top_n_reads_only_the_page(self, runs):
+        from client import conn
+        round_trips = conn.round_trips
+        latest = Run.filter(name='a').order_by('-updated')[:3]
+        assert [run.id.value for run in latest] == [29, 27, 25]
+        assert conn.round_trips - round_trips == 2
+        assert [run.id.value for run in Run.filter(name='b').order_by('updated')[:2]] == [2, 4]
+
+    def test_order_by_with_ties_and_residual(self, runs):
+        expected = sorted(range(1, 31), key=lambda i: (i % 7, str(i)))
+        assert [run.id.value for run in Run.filter().order_by('attempts')] == expected
+        assert [run.id.value for run in Run.filter(name='a').order_by('-attempts')] == [
+            i for i in reversed(expected) if i % 2
+        ]
+        assert Run.filter(attempts=3).order_by('attempts').values_list('id', flat=True)[:] == [10, 17, 24, 3]
+
+    def test_keyset_pagination(self, runs):
+        expected = sorted(range(1, 31), key=lambda i: (i % 7, str(i)), reverse=True)
+        queryset = Run.filter().order_by('-attempts')
+        result, cursor, pages = [], None, 0
+        while True:
+            objects, cursor = queryset.page(4, after=cursor)
+            result.extend(run.id.value for run in objects)
+            pages += 1
+            if cursor is None:
+                break
+        assert result == expected
+        assert pages == 8
+        assert Run.filter(name='c').order_by('-updated').page(5) == ([], None)
+
+    def test_save_and_delete_move_ordered_entries(self, runs):
+        run = Run.get(id=29)
+        run.updated = datetime(2023, 1, 1)
+        run.save()
+        assert [run.id.value for run in Run.filter(name='a').order_by('updated')[:2]] == [29, 1]
+        run.delete()
+        assert [run.id.value for run in Run.filter(name='a').order_by('-updated')[:1]] == [27]
+        assert Run.filter(name='a').order_by('updated').count() == 14
+
+    def test_order_by_needs_an_ordered_index(self, runs):
+        with pytest.raises(InvalidInputException):
+            list(Run.filter().order_by('updated'))
+        with pytest.raises(InvalidInputException):
+            Run.filter().order_by('missing')
+        with pytest.raises(InvalidInputException):
+            Run.filter().page(5)
+        with pytest.raises(InvalidInputException):
+            type('Bad', (BaseModel,), {'name': CharField(), 'Meta': type('Meta', (), {'ordered_indexes': [('name',)]})})